@@ -66,17 +66,19 @@ prepare_metadata_for_build_editable = prepare_metadata_for_build_wheel
 
 def build_wheel(wheel_directory, config_settings=None, metadata_directory=None):
     """Builds a wheel, places it in wheel_directory"""
-    info = make_wheel_in(pyproj_toml, Path(wheel_directory))
+    info = make_wheel_in(pyproj_toml, Path(wheel_directory),
+                         config_settings=config_settings)
     return info.file.name
 
 def build_editable(wheel_directory, config_settings=None, metadata_directory=None):
     """Builds an "editable" wheel, places it in wheel_directory"""
-    info = make_wheel_in(pyproj_toml, Path(wheel_directory), editable=True)
+    info = make_wheel_in(pyproj_toml, Path(wheel_directory), editable=True,
+                         config_settings=config_settings)
     return info.file.name
 
 def build_sdist(sdist_directory, config_settings=None):
     """Builds an sdist, places it in sdist_directory"""
-    path = SdistBuilder.from_ini_path(pyproj_toml).build(Path(sdist_directory))
+    path = SdistBuilder.from_ini_path(pyproj_toml, config_settings).build(Path(sdist_directory))
     return path.name
 
 
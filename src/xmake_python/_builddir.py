@@ -0,0 +1,54 @@
+"""A build directory kept between builds.
+
+xmake keeps its configuration (``.xmake/``) and object files (``build/``)
+in the directory of the project it builds, which is the build directory.
+The project is installed into a staging tree of its own in the build
+directory, which is the only part removed before each build, along with the
+files WheelBuilder writes next to it, so that xmake only recompiles what
+changed.
+"""
+from __future__ import annotations
+
+import os
+import shutil
+from pathlib import Path
+
+__all__ = ["STAGING_DIR", "BuildDirectory"]
+
+# Name of the staging tree in the build directory
+STAGING_DIR = "xmake-python-staging"
+
+
+def __dir__() -> list[str]:
+    return __all__
+
+
+class BuildDirectory:
+    """Like TemporaryDirectory, for a directory which is kept
+
+    ``path`` is the build directory, ``name`` the staging tree in it, which
+    is emptied when it is created.
+    """
+    def __init__(self, path: str | os.PathLike):
+        self.path = str(path)
+        self.name = str(Path(path) / STAGING_DIR)
+        self.clean()
+
+    def clean(self) -> None:
+        if os.path.isdir(self.name) and not os.path.islink(self.name):
+            shutil.rmtree(self.name)
+        elif os.path.lexists(self.name):
+            os.unlink(self.name)
+        os.makedirs(self.name)
+
+    def __enter__(self) -> str:
+        return self.name
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+    def cleanup(self) -> None:
+        pass
+
+    def __repr__(self):
+        return '<BuildDirectory {!r}>'.format(self.path)
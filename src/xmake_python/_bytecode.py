@@ -0,0 +1,86 @@
+"""Compile the modules of a wheel to bytecode ahead of installation.
+
+The pycs use hash-based invalidation, so they don't depend on the mtime of
+the sources and the wheel stays reproducible. They are compiled for the
+interpreter running the build: others just ignore them.
+"""
+from __future__ import annotations
+
+import importlib.util
+import logging
+import multiprocessing
+import os
+import py_compile
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+    from pathlib import Path
+
+__all__ = ["compile_modules"]
+
+log = logging.getLogger(__name__)
+
+# Below this many files, starting worker processes costs more than it saves
+MIN_POOL_TASKS = 32
+
+
+def __dir__() -> list[str]:
+    return __all__
+
+
+def _compile_one(task: tuple[str, str, str, int]) -> str | None:
+    """Compile a module, return the error message if it can't be compiled"""
+    source, cfile, dfile, optimize = task
+    try:
+        py_compile.compile(
+            source, cfile, dfile, doraise=True, optimize=optimize,
+            invalidation_mode=py_compile.PycInvalidationMode.CHECKED_HASH,
+        )
+    except py_compile.PyCompileError as e:
+        return e.msg
+    return None
+
+
+def compile_modules(
+    modules: Iterable[tuple[str, str]],
+    directory: Path,
+    levels: Iterable[int],
+    jobs: int = 1,
+) -> list[tuple[str, str]]:
+    """Compile modules to pycs in directory, at every optimization level
+
+    ``modules`` are the paths in the wheel and the source files of modules.
+    With ``jobs`` other than 1, modules are compiled by that many processes
+    (0 means one per CPU). Returns the path in the wheel and the full path
+    of every pyc, in the order of ``modules``. Modules which can't be
+    compiled are skipped with a warning, like compileall does.
+    """
+    tasks = []
+    for arcname, source in modules:
+        for level in levels:
+            pyc = importlib.util.cache_from_source(arcname, optimization=level or '')
+            tasks.append((source, os.path.join(directory, pyc), arcname, level))
+    for task in tasks:
+        os.makedirs(os.path.dirname(task[1]), exist_ok=True)
+
+    workers = jobs or os.cpu_count() or 1
+    if workers == 1 or len(tasks) < MIN_POOL_TASKS:
+        errors = list(map(_compile_one, tasks))
+    else:
+        # Don't fork a process with the threads of the deflate pool running
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(workers, mp_context=context) as executor:
+            errors = list(executor.map(
+                _compile_one, tasks, chunksize=max(1, len(tasks) // (4 * workers)),
+            ))
+
+    compiled = []
+    for (source, cfile, arcname, level), error in zip(tasks, errors):
+        if error is not None:
+            log.warning("Not compiling %s: %s", arcname, error)
+            continue
+        pyc = os.path.relpath(cfile, directory).replace(os.sep, '/')
+        compiled.append((pyc, cfile))
+    return compiled
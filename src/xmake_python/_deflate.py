@@ -0,0 +1,93 @@
+"""Deflate implementations used to write wheels and sdists.
+
+The stdlib zlib is the reference. ISA-L and zlib-ng (through the ``isal``
+and ``zlib-ng`` packages) write valid deflate streams several times faster,
+but not the same bytes, so a build which has to match older ones byte for
+byte can force the stdlib backend.
+"""
+from __future__ import annotations
+
+import functools
+import gzip
+import logging
+import zlib
+
+__all__ = ["BACKENDS", "DeflateBackend", "ZLIB", "get_backend", "open_gzip"]
+
+log = logging.getLogger(__name__)
+
+# Names accepted for the deflate-backend settings, auto picks the fastest
+BACKENDS = ("auto", "isal", "zlib-ng", "zlib")
+
+
+def __dir__() -> list[str]:
+    return __all__
+
+
+class DeflateBackend:
+    """A zlib-compatible module, and how zlib levels map to its levels"""
+    def __init__(self, name, module, map_level=None):
+        self.name = name
+        self.module = module
+        self.crc32 = module.crc32
+        self._map_level = map_level
+
+    def level(self, level: int) -> int:
+        if self._map_level is None:
+            return level
+        return self._map_level(level)
+
+    def compressobj(self, level: int):
+        """A compressor for raw deflate streams, as zipfile and gzip write"""
+        return self.module.compressobj(
+            self.level(level), zlib.DEFLATED, -zlib.MAX_WBITS, zlib.DEF_MEM_LEVEL, 0,
+        )
+
+    def compress(self, data: bytes, level: int) -> bytes:
+        compressor = self.compressobj(level)
+        return compressor.compress(data) + compressor.flush()
+
+    def __repr__(self):
+        return 'DeflateBackend({!r})'.format(self.name)
+
+
+ZLIB = DeflateBackend("zlib", zlib)
+
+
+def _isal_level(level: int) -> int:
+    # ISA-L only has levels 0 to 3, 2 being its default
+    if level < 0:
+        return 2
+    return min(3, (level + 1) // 3)
+
+
+def _load(name: str) -> DeflateBackend:
+    if name == "isal":
+        from isal import isal_zlib
+        return DeflateBackend(name, isal_zlib, _isal_level)
+    if name == "zlib-ng":
+        from zlib_ng import zlib_ng
+        return DeflateBackend(name, zlib_ng)
+    return ZLIB
+
+
+@functools.lru_cache(maxsize=None)
+def get_backend(name: str = "auto") -> DeflateBackend:
+    """Get a deflate backend by name, falling back to the stdlib zlib"""
+    for candidate in (("isal", "zlib-ng") if name == "auto" else (name,)):
+        try:
+            return _load(candidate)
+        except ImportError:
+            if name != "auto":
+                log.warning("%s is not installed, deflating with zlib", name)
+    return ZLIB
+
+
+def open_gzip(filename: str, mtime: int, backend: DeflateBackend = ZLIB) -> gzip.GzipFile:
+    """Open a gzip file for writing, compressing with backend"""
+    gz = gzip.GzipFile(filename, mode='wb', mtime=mtime)
+    if backend is not ZLIB:
+        # GzipFile deflates through this object, the header and the CRC in
+        # the trailer don't depend on the implementation
+        gz.compress = backend.compressobj(9)  # GzipFile's default level
+    return gz
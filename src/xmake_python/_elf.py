@@ -0,0 +1,223 @@
+"""Read ELF objects, and split their debug info out and strip them.
+
+The debug info of each shared object or executable is copied to a separate
+file with ``objcopy --only-keep-debug``, named after the build-id of the
+object as debuggers look it up (``.build-id/ab/cdef....debug``). The
+object is then stripped and linked to its debug file with
+``--add-gnu-debuglink``.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+import struct
+import subprocess
+from concurrent.futures import Executor
+from pathlib import Path
+from typing import TYPE_CHECKING, NamedTuple
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+__all__ = [
+    "ACTIONS",
+    "DebugInfoSplitter",
+    "DynamicInfo",
+    "elf_arch",
+    "is_elf",
+    "read_build_id",
+    "read_dynamic",
+]
+
+log = logging.getLogger(__name__)
+
+# What to do with the debug info of ELF objects
+ACTIONS = ("keep", "strip", "split")
+
+ELF_MAGIC = b'\x7fELF'
+ET_EXEC, ET_DYN = 2, 3
+SHT_NOTE = 7
+SHT_DYNAMIC = 6
+NT_GNU_BUILD_ID = 3
+DT_NULL, DT_NEEDED, DT_SONAME, DT_RPATH, DT_RUNPATH = 0, 1, 14, 15, 29
+
+
+def __dir__() -> list[str]:
+    return __all__
+
+
+class _Header(NamedTuple):
+    prefix: str
+    is64: bool
+    e_type: int
+    e_machine: int
+    shoff: int
+    shentsize: int
+    shnum: int
+
+
+class DynamicInfo(NamedTuple):
+    """The dynamic section of an ELF object"""
+    soname: str | None
+    needed: list[str]
+    rpath: list[str]
+    runpath: list[str]
+
+
+def _read_header(f) -> _Header | None:
+    ident = f.read(16)
+    if len(ident) < 16 or ident[:4] != ELF_MAGIC:
+        return None
+    is64 = ident[4] == 2
+    prefix = '<' if ident[5] == 1 else '>'
+    if is64:
+        fmt = prefix + 'HHIQQQIHHHHHH'
+    else:
+        fmt = prefix + 'HHIIIIIHHHHHH'
+    data = f.read(struct.calcsize(fmt))
+    if len(data) < struct.calcsize(fmt):
+        return None
+    (e_type, e_machine, _, _, _, shoff, _, _, _, _, shentsize, shnum, _) = struct.unpack(fmt, data)
+    return _Header(prefix, is64, e_type, e_machine, shoff, shentsize, shnum)
+
+
+def _sections(f, header: _Header):
+    """Yield the type, offset, size and link of every section"""
+    shfmt = header.prefix + ('IIQQQQIIQQ' if header.is64 else 'IIIIIIIIII')
+    for i in range(header.shnum):
+        f.seek(header.shoff + i * header.shentsize)
+        section = struct.unpack(shfmt, f.read(struct.calcsize(shfmt)))
+        yield section[1], section[4], section[5], section[6]
+
+
+def is_elf(path: str) -> bool:
+    """Whether a file is an ELF shared object or executable"""
+    try:
+        with open(path, 'rb') as f:
+            header = _read_header(f)
+    except OSError:
+        return False
+    return header is not None and header.e_type in (ET_EXEC, ET_DYN)
+
+
+def elf_arch(path: str) -> tuple[bool, int] | None:
+    """Whether an ELF object is 64 bit, and its machine, to match libraries"""
+    with open(path, 'rb') as f:
+        header = _read_header(f)
+    if header is None:
+        return None
+    return header.is64, header.e_machine
+
+
+def read_build_id(path: str) -> str | None:
+    """Get the build-id of an ELF object as hex, from its note sections"""
+    with open(path, 'rb') as f:
+        header = _read_header(f)
+        if header is None:
+            return None
+        for sh_type, sh_offset, sh_size, _ in list(_sections(f, header)):
+            if sh_type != SHT_NOTE:
+                continue
+            f.seek(sh_offset)
+            notes = f.read(sh_size)
+            pos = 0
+            while pos + 12 <= len(notes):
+                namesz, descsz, note_type = struct.unpack_from(header.prefix + 'III', notes, pos)
+                pos += 12
+                name = notes[pos:pos + namesz]
+                pos += (namesz + 3) & ~3
+                desc = notes[pos:pos + descsz]
+                pos += (descsz + 3) & ~3
+                if note_type == NT_GNU_BUILD_ID and name.rstrip(b'\0') == b'GNU':
+                    return desc.hex()
+    return None
+
+
+def read_dynamic(path: str) -> DynamicInfo:
+    """Get the soname, DT_NEEDED, DT_RPATH and DT_RUNPATH of an ELF object"""
+    info = DynamicInfo(None, [], [], [])
+    with open(path, 'rb') as f:
+        header = _read_header(f)
+        if header is None:
+            return info
+        sections = list(_sections(f, header))
+        for sh_type, sh_offset, sh_size, sh_link in sections:
+            if sh_type != SHT_DYNAMIC:
+                continue
+            f.seek(sh_offset)
+            dynamic = f.read(sh_size)
+            _, strtab_offset, strtab_size, _ = sections[sh_link]
+            f.seek(strtab_offset)
+            strtab = f.read(strtab_size)
+            break
+        else:
+            return info
+
+    def string(offset):
+        return strtab[offset:strtab.index(b'\0', offset)].decode('utf-8', 'surrogateescape')
+
+    entry = header.prefix + ('qQ' if header.is64 else 'iI')
+    soname = None
+    for tag, value in struct.iter_unpack(entry, dynamic):
+        if tag == DT_NULL:
+            break
+        if tag == DT_NEEDED:
+            info.needed.append(string(value))
+        elif tag == DT_SONAME:
+            soname = string(value)
+        elif tag == DT_RPATH:
+            info.rpath.extend(p for p in string(value).split(':') if p)
+        elif tag == DT_RUNPATH:
+            info.runpath.extend(p for p in string(value).split(':') if p)
+    return info._replace(soname=soname)
+
+
+class DebugInfoSplitter:
+    """Strip ELF objects, keeping their debug info in ``debug_dir`` for split"""
+    def __init__(self, action: str, debug_dir: Path):
+        self.action = action
+        self.debug_dir = debug_dir
+        self.objcopy = os.environ.get('OBJCOPY') or shutil.which('objcopy')
+        self.strip = os.environ.get('STRIP') or shutil.which('strip')
+        self.saved = 0
+        self.debug_files = []
+
+    def _debug_path(self, path: str, arcname: str) -> Path:
+        build_id = read_build_id(path)
+        if build_id is None or len(build_id) < 3:
+            return self.debug_dir / (arcname + '.debug')
+        return self.debug_dir / '.build-id' / build_id[:2] / (build_id[2:] + '.debug')
+
+    def process(self, path: str, arcname: str) -> int:
+        """Strip one object, return how many bytes it lost"""
+        size = os.stat(path).st_size
+        if self.action == 'split':
+            debug_path = self._debug_path(path, arcname)
+            debug_path.parent.mkdir(parents=True, exist_ok=True)
+            subprocess.run([self.objcopy, '--only-keep-debug', path, str(debug_path)],
+                           check=True)
+            self.debug_files.append(debug_path)
+        subprocess.run([self.strip, '--strip-unneeded', path], check=True)
+        if self.action == 'split':
+            subprocess.run(
+                [self.objcopy, '--add-gnu-debuglink=' + str(debug_path), path],
+                check=True,
+            )
+        return size - os.stat(path).st_size
+
+    def run(self, files: Iterable[tuple[str, str]], executor: Executor | None = None) -> int:
+        """Process (full path, path in the wheel) of the ELF objects among files"""
+        if self.action == 'keep':
+            return 0
+        if self.strip is None or (self.action == 'split' and self.objcopy is None):
+            log.warning("strip or objcopy not found, not stripping debug info")
+            return 0
+        objects = [(path, arcname) for path, arcname in files if is_elf(path)]
+        if executor is None:
+            saved = [self.process(*obj) for obj in objects]
+        else:
+            saved = list(executor.map(lambda obj: self.process(*obj), objects))
+        self.saved = sum(saved)
+        log.info("Stripped %d ELF object(s), saving %d bytes", len(objects), self.saved)
+        return self.saved
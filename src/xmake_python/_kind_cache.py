@@ -0,0 +1,112 @@
+"""Cache the kind of wheel a project builds between builds.
+
+Whether a project gives a pure, a binary or an extension module wheel only
+depends on its build scripts, so the result of ``XMaker.show()`` or
+``Maker.show()`` is kept with a key made of the hashes of those scripts,
+the build tool and its command. While the key doesn't change, the project
+isn't introspected again.
+"""
+from __future__ import annotations
+
+import contextlib
+import glob
+import hashlib
+import json
+import os
+import re
+import shutil
+from pathlib import Path
+
+__all__ = ["KindCache", "executable_id", "hash_files", "xmake_scripts"]
+
+CACHE_VERSION = 1
+
+# includes("a", "b/xmake.lua", "**/xmake.lua") in a xmake.lua
+INCLUDES_RE = re.compile(r'\bincludes\s*\(([^)]*)\)')
+STRING_RE = re.compile(r'"([^"]*)"|\'([^\']*)\'')
+
+
+def __dir__() -> list[str]:
+    return __all__
+
+
+def xmake_scripts(xmake_lua: Path) -> list[Path]:
+    """The xmake.lua of a project and every script it includes, recursively"""
+    scripts = []
+    pending = [Path(xmake_lua)]
+    while pending:
+        script = Path(os.path.normpath(pending.pop(0)))
+        if script in scripts or not script.is_file():
+            continue
+        scripts.append(script)
+        text = script.read_text(encoding='utf-8', errors='replace')
+        for args in INCLUDES_RE.findall(text):
+            for double, single in STRING_RE.findall(args):
+                name = double or single
+                # Modules bundled with xmake
+                if name.startswith('@'):
+                    continue
+                path = script.parent / name
+                if glob.has_magic(name):
+                    paths = sorted(Path(p) for p in glob.glob(str(path), recursive=True))
+                else:
+                    paths = [path]
+                pending.extend(p / 'xmake.lua' if p.is_dir() else p for p in paths)
+    return scripts
+
+
+def hash_files(paths) -> dict[str, str]:
+    """The sha256 of the content of the files which exist among paths"""
+    hashes = {}
+    for path in paths:
+        try:
+            with open(path, 'rb') as f:
+                hashes[str(path)] = hashlib.file_digest(f, 'sha256').hexdigest()
+        except OSError:
+            pass
+    return hashes
+
+
+def executable_id(program: str) -> list | None:
+    """Identify the version of a program by the size and mtime of its file
+
+    Running it to ask for its version would cost as much as what is cached.
+    """
+    path = shutil.which(program) if program else None
+    if path is None:
+        return None
+    st = os.stat(path)
+    return [os.path.realpath(path), st.st_size, st.st_mtime_ns]
+
+
+class KindCache:
+    """The kind of wheel and the targets of a project, kept in ``path``
+
+    The cache is best effort: when it can't be read or written, the project
+    is introspected as if nothing was cached.
+    """
+    def __init__(self, path: Path):
+        self.path = path
+
+    def get(self, key: dict) -> tuple[int, list] | None:
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if cache.get('version') != CACHE_VERSION or cache.get('key') != key:
+            return None
+        return cache['kind'], cache['targets']
+
+    def put(self, key: dict, kind: int, targets: list) -> None:
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'version': CACHE_VERSION, 'key': key, 'kind': kind, 'targets': targets,
+                }, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp_path)
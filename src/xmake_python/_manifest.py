@@ -0,0 +1,148 @@
+"""The plan of a wheel: which member comes from where, and how.
+
+Every stage of WheelBuilder adds entries to a Manifest instead of writing
+to the archive directly. The complete plan can then be checked (e.g. for
+two files claiming the same path in the wheel), dumped, or handed to the
+writer, which executes it in order.
+"""
+from __future__ import annotations
+
+import os
+from typing import TYPE_CHECKING
+
+import pathspec
+
+from .common import normalize_file_permissions
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
+__all__ = ["Manifest", "ManifestEntry", "PathFilter", "scan_dir"]
+
+
+def __dir__() -> list[str]:
+    return __all__
+
+
+class ManifestEntry:
+    """A planned member of a wheel
+
+    A member is either copied from the file ``source``, whose stat result is
+    ``stat``, or generated, in which case ``data`` holds its content.
+    ``mode`` is the normalized mode it gets in the archive, and ``level``
+    the compression level chosen for it.
+    """
+    __slots__ = ('arcname', 'source', 'stat', 'mode', 'level', 'data')
+
+    def __init__(self, arcname, source=None, st=None, mode=0o644, level=-1, data=None):
+        self.arcname = arcname
+        self.source = source
+        self.stat = st
+        self.mode = mode
+        self.level = level
+        self.data = data
+
+    @classmethod
+    def from_file(cls, arcname, source, st, level=-1):
+        # Normalize permission bits to either 755 (executable) or 644
+        mode = normalize_file_permissions(st.st_mode) & 0xFFFF
+        return cls(arcname, source, st, mode, level)
+
+    @property
+    def size(self):
+        if self.data is not None:
+            return len(self.data)
+        return self.stat.st_size
+
+    def __repr__(self):
+        return 'ManifestEntry({!r}, {!r})'.format(self.arcname, self.source)
+
+
+class Manifest:
+    """Ordered entries of a wheel, with unique paths in the archive"""
+    def __init__(self):
+        self.entries = []
+        self._arcnames = {}
+
+    def __iter__(self) -> Iterator[ManifestEntry]:
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, arcname: str) -> ManifestEntry | None:
+        return self._arcnames.get(arcname)
+
+    def add(self, entry: ManifestEntry) -> None:
+        other = self._arcnames.get(entry.arcname)
+        if other is not None:
+            raise ValueError(
+                "{} would be written twice in the wheel, from {} and {}".format(
+                    entry.arcname, other.source or "generated data",
+                    entry.source or "generated data",
+                )
+            )
+        self._arcnames[entry.arcname] = entry
+        self.entries.append(entry)
+
+    def move_to_end(self, arcname: str) -> ManifestEntry | None:
+        """Move an entry, if planned, to the end of the archive"""
+        entry = self._arcnames.get(arcname)
+        if entry is not None:
+            self.entries.remove(entry)
+            self.entries.append(entry)
+        return entry
+
+    def dump(self, fp) -> None:
+        """Write the plan as tab separated mode, size, compression, path, source"""
+        for entry in self:
+            if entry.level == 0:
+                compression = 'stored'
+            elif entry.level < 0:
+                compression = 'deflate'
+            else:
+                compression = 'deflate-{}'.format(entry.level)
+            fp.write('{:o}\t{}\t{}\t{}\t{}\n'.format(
+                entry.mode, entry.size, compression, entry.arcname,
+                entry.source or '-',
+            ))
+
+
+class PathFilter:
+    """Leave out files matching ``exclude``, unless they match ``include``
+
+    Both are gitignore-style patterns matched against paths in the wheel.
+    """
+    def __init__(self, exclude: Iterable[str] = (), include: Iterable[str] = ()):
+        self.exclude = pathspec.GitIgnoreSpec.from_lines(list(exclude))
+        self.include = pathspec.GitIgnoreSpec.from_lines(list(include))
+        self.excluded = 0
+
+    def __bool__(self):
+        return bool(self.exclude.patterns)
+
+    def excludes(self, arcname: str) -> bool:
+        return self.exclude.match_file(arcname) and not self.include.match_file(arcname)
+
+
+def scan_dir(directory, prefix='') -> Iterator[tuple[str, str, os.stat_result]]:
+    """Walk a directory with scandir, in the same order as walk_data_dir()
+
+    Yields the full path, the /-separated path prefixed with prefix and the
+    stat result of every file. Excludes any __pycache__ subdirectories.
+    """
+    try:
+        with os.scandir(directory) as it:
+            entries = sorted(it, key=lambda e: e.name)
+    except (FileNotFoundError, NotADirectoryError):
+        return
+    dirs = []
+    for entry in entries:
+        if entry.is_dir():
+            # Like os.walk(), don't follow symlinks to directories
+            if not entry.is_symlink() and entry.name != '__pycache__':
+                dirs.append(entry)
+            continue
+        yield entry.path, prefix + entry.name, entry.stat()
+    for entry in dirs:
+        yield from scan_dir(entry.path, prefix + entry.name + '/')
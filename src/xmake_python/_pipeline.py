@@ -0,0 +1,122 @@
+"""Compress staged files while the build system is still installing.
+
+A Prefetcher polls the staging tree while ``xmake install`` (or
+``make install``) runs, and hands every file which has settled, i.e. whose
+size, mode, mtime and inode didn't change between two polls, to the worker pool.
+When the wheel is written afterwards, files which weren't touched since
+then are taken from the prefetched results, so that most of the reading,
+hashing and compressing is hidden behind the install step.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from typing import TYPE_CHECKING
+
+from ._zip import STREAM_THRESHOLD
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable
+    from concurrent.futures import Executor, Future
+    import os
+    import zipfile
+
+__all__ = ["Prefetcher"]
+
+log = logging.getLogger(__name__)
+
+
+def __dir__() -> list[str]:
+    return __all__
+
+
+class Prefetcher:
+    """Poll the staging tree and compress settled files in the background
+
+    ``scan`` yields the full path, path in the wheel and stat result of
+    every staged file. ``prepare`` takes a path in the wheel and a stat
+    result, and returns the ZipInfo and compression level the wheel writer
+    would use. ``compress`` is submitted to ``executor`` with the ZipInfo,
+    path and level. At most ``max_bytes`` of files are prefetched, so the
+    results held in memory stay bounded.
+    """
+    def __init__(
+        self,
+        executor: Executor,
+        scan: Callable[[], Iterable[tuple[str, str, os.stat_result]]],
+        prepare: Callable[[str, os.stat_result], tuple[zipfile.ZipInfo, int]],
+        compress: Callable[..., tuple[bytes | None, str]],
+        interval: float = 0.2,
+        max_bytes: int = 512 * 1024 * 1024,
+    ):
+        self.executor = executor
+        self.scan = scan
+        self.prepare = prepare
+        self.compress = compress
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self._seen = {}
+        self._jobs = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def _key(st):
+        # The mode gives the permissions of the member, e.g. after a chmod +x
+        return st.st_size, st.st_mode, st.st_mtime_ns, st.st_ino
+
+    def poll(self) -> None:
+        for full_path, arcname, st in self.scan():
+            key = self._key(st)
+            if self._seen.get(full_path) != key:
+                # Maybe still being written, wait for the next poll
+                self._seen[full_path] = key
+                continue
+            job = self._jobs.get(full_path)
+            if job is not None and job[0] == key:
+                continue
+            if st.st_size > STREAM_THRESHOLD or self.bytes + st.st_size > self.max_bytes:
+                # Large files are streamed into the archive when it is written
+                continue
+            zinfo, level = self.prepare(arcname, st)
+            future = self.executor.submit(self.compress, zinfo, full_path, level)
+            self._jobs[full_path] = (key, arcname, level, zinfo, future)
+            self.bytes += st.st_size
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except OSError:
+                # Files may vanish while the build system installs them
+                continue
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        log.info("Prefetched %d staged files", len(self._jobs))
+
+    def take(self, full_path: str, arcname: str, st: os.stat_result,
+             level: int) -> tuple[zipfile.ZipInfo, Future] | None:
+        """Get the prefetched ZipInfo and result of a file, if still valid"""
+        job = self._jobs.pop(full_path, None)
+        if job is None:
+            return None
+        key, job_arcname, job_level, zinfo, future = job
+        if (key, job_arcname, job_level) != (self._key(st), arcname, level):
+            future.cancel()
+            return None
+        self.hits += 1
+        return zinfo, future
+
+    def cancel(self) -> None:
+        for job in self._jobs.values():
+            job[-1].cancel()
+        self._jobs.clear()
@@ -0,0 +1,68 @@
+"""Rows of RECORD, spilled to a file while the wheel is written.
+
+A wheel of millions of files has a RECORD of hundreds of megabytes. Rather
+than holding it in memory, rows are appended to a file in the staging tree
+as members are written, and that file is streamed into the archive last.
+"""
+from __future__ import annotations
+
+import csv
+import os
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+    from pathlib import Path
+
+__all__ = ["RecordFile"]
+
+
+def __dir__() -> list[str]:
+    return __all__
+
+
+class RecordFile:
+    """The RECORD of a wheel being written, kept in the file ``path``"""
+    def __init__(self, path: Path):
+        self.path = path
+        self.count = 0
+        self._fp = None
+
+    def _open(self):
+        if self._fp is None:
+            self._fp = open(self.path, 'w', encoding='utf-8', newline='')
+        return self._fp
+
+    def append(self, arcname: str, hash_digest: str, size: int) -> None:
+        if arcname.find(',') >= 0:
+            arcname = f'"{arcname}"'
+        self._open().write('{},sha256={},{}\n'.format(arcname, hash_digest, size))
+        self.count += 1
+
+    def finish(self, arcname: str) -> os.stat_result:
+        """Add the row of RECORD itself, and close the file"""
+        # RECORD itself is recorded with no hash or size
+        self._open().write(arcname + ',,\n')
+        self.close()
+        return os.stat(self.path)
+
+    def close(self) -> None:
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self) -> Iterator[tuple[str, str, int]]:
+        """Read back the (path, hash digest, size) of the recorded files"""
+        if self._fp is not None:
+            self._fp.flush()
+        try:
+            f = open(self.path, encoding='utf-8', newline='')
+        except FileNotFoundError:
+            return
+        with f:
+            for path, hash_, size in csv.reader(f):
+                if hash_:
+                    yield path, hash_.partition('=')[2], int(size)
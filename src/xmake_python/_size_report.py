@@ -0,0 +1,134 @@
+"""Break down the size of a wheel, and compare it with the previous build.
+
+The rows of RECORD give the size of every file, and the central directory of
+the wheel their compressed size. They are summed by top-level directory, by
+extension and by install scheme (``purelib``/``platlib`` for the root of the
+wheel, the scheme for ``.data`` files). The report of each build is kept in
+the cache directory of the project for the next build to be compared with.
+"""
+from __future__ import annotations
+
+import json
+import os
+import posixpath
+from pathlib import Path
+
+__all__ = ["GROUPINGS", "SizeReport", "format_size"]
+
+REPORT_VERSION = 1
+
+GROUPINGS = ("top-level", "extension", "scheme")
+
+
+def __dir__() -> list[str]:
+    return __all__
+
+
+def format_size(size: int) -> str:
+    for unit in ('B', 'KiB', 'MiB'):
+        if abs(size) < 1024:
+            return '{:.1f} {}'.format(size, unit) if unit != 'B' else '{} B'.format(size)
+        size /= 1024
+    return '{:.1f} GiB'.format(size)
+
+
+class SizeReport:
+    """Sizes of the files of a wheel, uncompressed and compressed, by group"""
+    def __init__(self, wheel: str, groups: dict | None = None):
+        self.wheel = wheel
+        self.total = {'files': 0, 'size': 0, 'compressed': 0}
+        self.groups = groups or {grouping: {} for grouping in GROUPINGS}
+
+    @classmethod
+    def from_records(cls, wheel, records, zinfos, root_scheme='purelib'):
+        """Build the report from (path, hash, size) rows and ZipInfo by path"""
+        report = cls(wheel)
+        for path, _, size in records:
+            zinfo = zinfos.get(path)
+            if zinfo is None:
+                continue
+            size = int(size) if size else zinfo.file_size
+            report.add(path, size, zinfo.compress_size, root_scheme)
+        return report
+
+    def add(self, path: str, size: int, compressed: int, root_scheme: str) -> None:
+        top, _, rest = path.partition('/')
+        scheme = root_scheme
+        if top.endswith('.data') and rest:
+            scheme = rest.partition('/')[0]
+        keys = {
+            'top-level': top + '/' if rest else top,
+            'extension': posixpath.splitext(path)[1].lower() or '(none)',
+            'scheme': scheme,
+        }
+        for sizes in [self.total] + [
+                self.groups[grouping].setdefault(key, {'files': 0, 'size': 0, 'compressed': 0})
+                for grouping, key in keys.items()]:
+            sizes['files'] += 1
+            sizes['size'] += size
+            sizes['compressed'] += compressed
+
+    def to_dict(self) -> dict:
+        return {
+            'version': REPORT_VERSION,
+            'wheel': self.wheel,
+            'total': self.total,
+            'groups': self.groups,
+        }
+
+    @classmethod
+    def load(cls, path: Path) -> SizeReport | None:
+        """Load a saved report, None if there is none or it can't be read"""
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('version') != REPORT_VERSION:
+            return None
+        report = cls(data['wheel'], data['groups'])
+        report.total = data['total']
+        return report
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + '.tmp')
+        tmp_path.write_text(json.dumps(self.to_dict(), indent=2) + '\n', encoding='utf-8')
+        os.replace(tmp_path, path)
+
+    def summary(self, grouping: str = 'top-level') -> list[str]:
+        lines = ['{}: {} files, {} ({} compressed)'.format(
+            self.wheel, self.total['files'], format_size(self.total['size']),
+            format_size(self.total['compressed']),
+        )]
+        groups = sorted(self.groups[grouping].items(), key=lambda item: -item[1]['compressed'])
+        for key, sizes in groups:
+            lines.append('  {:<40} {:>6} files {:>12} {:>12}'.format(
+                key, sizes['files'], format_size(sizes['size']),
+                format_size(sizes['compressed']),
+            ))
+        return lines
+
+    def diff(self, previous: SizeReport) -> list[str]:
+        """The changes of compressed size since previous, largest first"""
+        changes = []
+        for grouping in GROUPINGS:
+            old_groups = previous.groups.get(grouping, {})
+            new_groups = self.groups[grouping]
+            for key in sorted(set(old_groups) | set(new_groups)):
+                old = old_groups.get(key, {}).get('compressed', 0)
+                new = new_groups.get(key, {}).get('compressed', 0)
+                if old != new:
+                    changes.append((grouping, key, old, new))
+        changes.sort(key=lambda change: -abs(change[3] - change[2]))
+        total_old, total_new = previous.total['compressed'], self.total['compressed']
+        lines = ['{} compressed: {} -> {} ({}{})'.format(
+            self.wheel, format_size(total_old), format_size(total_new),
+            '+' if total_new >= total_old else '-', format_size(abs(total_new - total_old)),
+        )]
+        for grouping, key, old, new in changes:
+            lines.append('  {:<10} {:<40} {:>12} -> {:>12} ({}{})'.format(
+                grouping, key, format_size(old), format_size(new),
+                '+' if new >= old else '-', format_size(abs(new - old)),
+            ))
+        return lines
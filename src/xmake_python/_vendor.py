@@ -0,0 +1,200 @@
+"""Vendor the external shared libraries needed by the ELF objects of a wheel.
+
+Before the wheel is written, the DT_NEEDED entries of the staged ELF
+objects are resolved like the dynamic loader does. Libraries which are
+neither in the wheel nor allowed to come from the system by the policy are
+copied into ``<name>.libs`` in the wheel, and the RPATH of the objects
+needing them is rewritten with patchelf to find them there. This is what
+auditwheel repair does, without unpacking and repacking the wheel.
+"""
+from __future__ import annotations
+
+import fnmatch
+import glob
+import json
+import logging
+import os
+import shutil
+import subprocess
+from pathlib import Path
+
+from ._elf import DynamicInfo, elf_arch, read_dynamic
+
+__all__ = ["DependencyCache", "LibraryVendor", "POLICIES"]
+
+log = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+
+# Libraries which installers can assume on the system (PEP 599, PEP 600)
+MANYLINUX_LIBS = [
+    "libgcc_s.so.1", "libstdc++.so.6", "libm.so.6", "libdl.so.2", "librt.so.1",
+    "libc.so.6", "libnsl.so.1", "libutil.so.1", "libpthread.so.0",
+    "libresolv.so.2", "libX11.so.6", "libXext.so.6", "libXrender.so.1",
+    "libICE.so.6", "libSM.so.6", "libGL.so.1", "libgobject-2.0.so.0",
+    "libgthread-2.0.so.0", "libglib-2.0.so.0", "libcrypt.so.1", "libexpat.so.1",
+    "libz.so.1", "ld-linux*.so.*", "ld64.so.*", "linux-vdso.so.1",
+]
+POLICIES = {
+    "manylinux": MANYLINUX_LIBS,
+    # Only the C library and the loader
+    "none": ["libc.so.6", "ld-linux*.so.*", "ld64.so.*", "linux-vdso.so.1"],
+}
+
+DEFAULT_LIB_DIRS = [
+    "/lib64", "/usr/lib64", "/lib", "/usr/lib",
+    "/lib/x86_64-linux-gnu", "/usr/lib/x86_64-linux-gnu",
+    "/lib/aarch64-linux-gnu", "/usr/lib/aarch64-linux-gnu",
+    "/usr/local/lib64", "/usr/local/lib",
+]
+
+
+def __dir__() -> list[str]:
+    return __all__
+
+
+def _ld_so_conf_dirs(conf: str = "/etc/ld.so.conf") -> list[str]:
+    """The directories listed in ld.so.conf, following its includes"""
+    dirs = []
+    try:
+        with open(conf, encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return dirs
+    for line in lines:
+        line = line.split('#', 1)[0].strip()
+        if line.startswith('include '):
+            pattern = line.split(None, 1)[1]
+            if not os.path.isabs(pattern):
+                pattern = os.path.join(os.path.dirname(conf), pattern)
+            for included in sorted(glob.glob(pattern)):
+                dirs += _ld_so_conf_dirs(included)
+        elif line:
+            dirs.append(line)
+    return dirs
+
+
+class DependencyCache:
+    """Dynamic sections of ELF objects, keyed by path and mtime, kept in ``path``"""
+    def __init__(self, path: Path | None = None):
+        self.path = path
+        self.entries = {}
+        self.used = {}
+        self.hits = 0
+        if path is not None:
+            try:
+                with open(path, encoding='utf-8') as f:
+                    cache = json.load(f)
+                if cache.get('version') == CACHE_VERSION:
+                    self.entries = cache['files']
+            except (OSError, ValueError):
+                pass
+
+    def get(self, path: str) -> DynamicInfo:
+        st = os.stat(path)
+        key = [st.st_size, st.st_mtime_ns]
+        entry = self.entries.get(path)
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            self.used[path] = entry
+            return DynamicInfo(*entry[1])
+        info = read_dynamic(path)
+        self.used[path] = [key, list(info)]
+        return info
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            # Only the objects of this build, staged paths change between builds
+            json.dump({'version': CACHE_VERSION, 'files': self.used}, f)
+
+
+class LibraryVendor:
+    """Copy the libraries needed by ELF objects into ``libs_dir``
+
+    Libraries matching the patterns of the ``policy`` or of ``allow`` are
+    expected on the system. ``patchelf`` is the program used to set RPATHs.
+    """
+    def __init__(self, libs_dir: Path, policy: str = "manylinux", allow=(),
+                 cache: DependencyCache | None = None, patchelf: str | None = None):
+        self.libs_dir = libs_dir
+        self.allow = list(POLICIES[policy]) + list(allow)
+        self.cache = cache or DependencyCache()
+        self.patchelf = patchelf or os.environ.get('PATCHELF') or shutil.which('patchelf')
+        self.vendored = {}
+        self._system_dirs = None
+
+    def allowed(self, name: str) -> bool:
+        return any(fnmatch.fnmatchcase(name, pattern) for pattern in self.allow)
+
+    def _search_dirs(self, info: DynamicInfo, origin: str) -> list[str]:
+        def expand(dirs):
+            return [d.replace('$ORIGIN', origin).replace('${ORIGIN}', origin) for d in dirs]
+        if self._system_dirs is None:
+            self._system_dirs = _ld_so_conf_dirs() + DEFAULT_LIB_DIRS
+        dirs = [] if info.runpath else expand(info.rpath)
+        dirs += [d for d in os.environ.get('LD_LIBRARY_PATH', '').split(':') if d]
+        return dirs + expand(info.runpath) + self._system_dirs
+
+    def resolve(self, name: str, info: DynamicInfo, origin: str, arch) -> str | None:
+        """Find a needed library like the dynamic loader"""
+        for directory in self._search_dirs(info, origin):
+            path = os.path.join(directory, name)
+            if os.path.isfile(path) and elf_arch(path) == arch:
+                return os.path.realpath(path)
+        return None
+
+    def run(self, objects: list[str]) -> dict[str, str]:
+        """Vendor the libraries needed by objects, return them by name"""
+        provided = {os.path.basename(path) for path in objects}
+        # Vendored libraries are scanned where they come from, whose path
+        # and mtime are stable between builds
+        queue = [(path, path) for path in objects]
+        rpaths = {}
+        while queue:
+            path, source = queue.pop(0)
+            info = self.cache.get(source)
+            arch = elf_arch(source)
+            for name in info.needed:
+                if self.allowed(name) or name in provided:
+                    continue
+                dest = self.vendored.get(name)
+                if dest is None:
+                    src = self.resolve(name, info, os.path.dirname(source), arch)
+                    if src is None:
+                        raise ValueError(
+                            "{} needs {}, which isn't allowed on the system and "
+                            "can't be found to be vendored".format(path, name)
+                        )
+                    self.libs_dir.mkdir(parents=True, exist_ok=True)
+                    dest = str(self.libs_dir / name)
+                    shutil.copyfile(src, dest)
+                    os.chmod(dest, 0o755)
+                    log.info("Vendoring %s from %s", name, src)
+                    self.vendored[name] = dest
+                    queue.append((dest, src))
+                rpaths.setdefault(path, set()).add(os.path.dirname(dest))
+        for path, dirs in sorted(rpaths.items()):
+            self.set_rpath(path, dirs)
+        self.cache.save()
+        return self.vendored
+
+    def set_rpath(self, path: str, dirs) -> None:
+        """Point the RPATH of an object to dirs, keeping its $ORIGIN entries"""
+        if self.patchelf is None:
+            raise ValueError("patchelf is needed to vendor shared libraries")
+        info = read_dynamic(path)
+        rpath = []
+        for directory in sorted(dirs):
+            rel = os.path.relpath(directory, os.path.dirname(path))
+            rpath.append('$ORIGIN' if rel == '.' else '$ORIGIN/' + Path(rel).as_posix())
+        rpath += [
+            d for d in info.runpath + info.rpath
+            if d.startswith(('$ORIGIN', '${ORIGIN}')) and d not in rpath
+        ]
+        subprocess.run(
+            [self.patchelf, '--force-rpath', '--set-rpath', ':'.join(rpath), path],
+            check=True,
+        )
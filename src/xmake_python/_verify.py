@@ -0,0 +1,167 @@
+"""Check the members of built wheels against their RECORD.
+
+Members are streamed out of the archive and hashed, without unpacking the
+wheel. Several wheels are checked in parallel by a process pool.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import hashlib
+import io
+import os
+import sys
+import zipfile
+import zlib
+from base64 import urlsafe_b64encode
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+__all__ = ["VerifyResult", "main", "verify_wheel", "verify_wheels"]
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def __dir__() -> list[str]:
+    return __all__
+
+
+@dataclass
+class VerifyResult:
+    """Problems found in a wheel, which is valid when there are none"""
+    path: str
+    # Paths whose hash or size doesn't match RECORD, with the reason
+    mismatched: list[tuple[str, str]] = field(default_factory=list)
+    # Paths in RECORD but not in the wheel
+    missing: list[str] = field(default_factory=list)
+    # Files in the wheel but not in RECORD
+    extra: list[str] = field(default_factory=list)
+    error: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        return not (self.mismatched or self.missing or self.extra or self.error)
+
+    def report(self) -> list[str]:
+        if self.ok:
+            return ["OK {}".format(self.path)]
+        lines = []
+        if self.error:
+            lines.append("{}: {}".format(self.path, self.error))
+        for name, reason in self.mismatched:
+            lines.append("{}: mismatched {} ({})".format(self.path, name, reason))
+        for name in self.missing:
+            lines.append("{}: missing {}".format(self.path, name))
+        for name in self.extra:
+            lines.append("{}: extra {}".format(self.path, name))
+        return lines
+
+
+def _find_record(zf: zipfile.ZipFile) -> str:
+    records = [
+        name for name in zf.namelist()
+        if name.count('/') == 1 and name.endswith('.dist-info/RECORD')
+    ]
+    if len(records) != 1:
+        raise ValueError("expected one .dist-info/RECORD, found {}".format(len(records)))
+    return records[0]
+
+
+def _check_member(zf: zipfile.ZipFile, name: str, hash_: str, size: str) -> str | None:
+    """Stream a member, return why it doesn't match its row, if it doesn't"""
+    algorithm, _, expected = hash_.partition('=')
+    try:
+        hashsum = hashlib.new(algorithm)
+    except ValueError:
+        return "unknown hash algorithm {}".format(algorithm)
+    actual_size = 0
+    try:
+        with zf.open(name) as f:
+            while buf := f.read(CHUNK_SIZE):
+                hashsum.update(buf)
+                actual_size += len(buf)
+    except (zlib.error, EOFError, zipfile.BadZipFile, NotImplementedError) as e:
+        # Corrupted or truncated data, or a bad CRC: the other members may be fine
+        return "can't be read: {}".format(e)
+    digest = urlsafe_b64encode(hashsum.digest()).decode('ascii').rstrip('=')
+    if digest != expected:
+        return "{} is {}, not {}".format(algorithm, digest, expected)
+    if size and int(size) != actual_size:
+        return "size is {}, not {}".format(actual_size, size)
+    return None
+
+
+def verify_wheel(path: str) -> VerifyResult:
+    """Check the hash and size of every member of a wheel against RECORD"""
+    result = VerifyResult(str(path))
+    try:
+        with zipfile.ZipFile(path) as zf:
+            record_name = _find_record(zf)
+            dist_info = record_name.rpartition('/')[0]
+            # Signatures of RECORD can't be listed in it
+            unlisted = {record_name, dist_info + '/RECORD.jws', dist_info + '/RECORD.p7s'}
+            with zf.open(record_name) as f:
+                rows = list(csv.reader(io.TextIOWrapper(f, encoding='utf-8', newline='')))
+            recorded = set()
+            members = set(zf.namelist())
+            for row in rows:
+                if not row:
+                    continue
+                name, hash_, size = (row + ['', ''])[:3]
+                recorded.add(name)
+                if name not in members:
+                    result.missing.append(name)
+                elif name not in unlisted:
+                    if not hash_:
+                        result.mismatched.append((name, "no hash in RECORD"))
+                        continue
+                    reason = _check_member(zf, name, hash_, size)
+                    if reason is not None:
+                        result.mismatched.append((name, reason))
+            result.extra = sorted(
+                name for name in members - recorded - unlisted
+                if not name.endswith('/')
+            )
+    except (OSError, ValueError, zipfile.BadZipFile) as e:
+        result.error = str(e)
+    return result
+
+
+def verify_wheels(paths: list[str], jobs: int = 0) -> list[VerifyResult]:
+    """Verify wheels with a pool of jobs processes, 0 meaning one per CPU"""
+    workers = min(jobs or os.cpu_count() or 1, len(paths))
+    if workers <= 1:
+        return [verify_wheel(path) for path in paths]
+    with ProcessPoolExecutor(workers) as executor:
+        return list(executor.map(verify_wheel, paths))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='python -m xmake_python.wheel verify',
+        description='check the files of wheels against their RECORD',
+    )
+    parser.add_argument('paths', nargs='+', type=Path,
+                        help='wheels, or directories of wheels')
+    parser.add_argument('--jobs', '-j', type=int, default=0,
+                        help='number of processes (defaults to one per CPU)')
+    parser.add_argument('--quiet', '-q', action='store_true',
+                        help='only report wheels with problems')
+    args = parser.parse_args(argv)
+
+    wheels = []
+    for path in args.paths:
+        if path.is_dir():
+            wheels.extend(str(p) for p in sorted(path.glob('*.whl')))
+        else:
+            wheels.append(str(path))
+    failed = 0
+    for result in verify_wheels(wheels, args.jobs):
+        if not result.ok:
+            failed += 1
+        if not (result.ok and args.quiet):
+            print('\n'.join(result.report()))
+    print("{} of {} wheels verified".format(len(wheels) - failed, len(wheels)),
+          file=sys.stderr)
+    return 1 if failed else 0
@@ -0,0 +1,123 @@
+"""Reuse members of the previous wheel for incremental rebuilds.
+
+After each build, a copy of the wheel is kept together with an index of the
+files it was made from, keyed by (path, size, mtime, inode). When building
+again, a file whose key hasn't changed doesn't need to be read, hashed or
+compressed: its compressed data is copied as is from the previous wheel,
+and its RECORD row is reused.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import shutil
+import zipfile
+from pathlib import Path
+
+from ._zip import member_data_offset
+
+__all__ = ["WheelIndex"]
+
+log = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+
+
+def __dir__() -> list[str]:
+    return __all__
+
+
+class WheelIndex:
+    """Files packaged in the previous wheel, and in the one being built
+
+    ``prefix`` is where the index is kept, without a suffix: the index goes
+    to ``prefix.json`` and the copy of the wheel to ``prefix.whl``. Members
+    are only reused when they were deflated by the same ``deflate`` backend.
+    """
+    def __init__(self, prefix: Path, deflate: str = 'zlib'):
+        self.index_path = prefix.with_suffix('.json')
+        self.wheel_path = prefix.with_suffix('.whl')
+        self.deflate = deflate
+        self.previous = {}
+        self.current = {}
+        self.hits = 0
+        self._zip = None
+
+    def load(self) -> None:
+        try:
+            with open(self.index_path, encoding='utf-8') as f:
+                index = json.load(f)
+            st = os.stat(self.wheel_path)
+        except (OSError, ValueError):
+            return
+        if index.get('version') != INDEX_VERSION or \
+                index.get('wheel') != [st.st_size, st.st_mtime_ns] or \
+                index.get('deflate', 'zlib') != self.deflate:
+            log.info("Ignoring stale wheel index %s", self.index_path)
+            return
+        try:
+            self._zip = zipfile.ZipFile(self.wheel_path)
+        except (OSError, zipfile.BadZipFile):
+            return
+        self.previous = index['files']
+
+    def close(self) -> None:
+        if self._zip is not None:
+            self._zip.close()
+            self._zip = None
+
+    @staticmethod
+    def _key(st: os.stat_result, level: int, auto: bool) -> list:
+        return [st.st_size, st.st_mtime_ns, st.st_ino, level, auto]
+
+    def lookup(self, path: str, st: os.stat_result, level: int, auto: bool):
+        """Find an unchanged file in the previous wheel
+
+        Returns the ZipInfo of its member in the previous wheel and its
+        sha256 digest as written in RECORD, or None.
+        """
+        entry = self.previous.get(path)
+        if entry is None or entry[:5] != self._key(st, level, auto):
+            return None
+        try:
+            zinfo = self._zip.getinfo(entry[5])
+        except KeyError:
+            return None
+        self.hits += 1
+        return zinfo, entry[6]
+
+    def open_member(self, zinfo: zipfile.ZipInfo):
+        """Open the previous wheel, positioned at the raw data of a member"""
+        f = open(self.wheel_path, 'rb')
+        try:
+            f.seek(member_data_offset(f, zinfo))
+        except BaseException:
+            f.close()
+            raise
+        return f
+
+    def read_member(self, zinfo: zipfile.ZipInfo) -> bytes:
+        """Read the raw (compressed) data of a member of the previous wheel"""
+        with self.open_member(zinfo) as f:
+            return f.read(zinfo.compress_size)
+
+    def add(self, path: str, st: os.stat_result, level: int, auto: bool,
+            arcname: str, hash_digest: str) -> None:
+        self.current[path] = self._key(st, level, auto) + [arcname, hash_digest]
+
+    def save(self, wheel_path: Path) -> None:
+        """Keep a copy of the new wheel and the index of its files"""
+        self.close()
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(wheel_path, self.wheel_path)
+        st = os.stat(self.wheel_path)
+        index = {
+            'version': INDEX_VERSION,
+            'wheel': [st.st_size, st.st_mtime_ns],
+            'deflate': self.deflate,
+            'files': self.current,
+        }
+        with open(self.index_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        log.info("Reused %d unchanged files from the previous wheel", self.hits)
@@ -0,0 +1,144 @@
+"""A static simple repository (PEP 503 and PEP 691) for a wheelhouse.
+
+Each project has a directory with an ``index.html`` and an ``index.json``
+listing its files. The JSON page is also the state of the index: adding a
+wheel loads the page of its project, replaces or adds the entry of the
+wheel and writes both pages again, so existing wheels are never read or
+hashed again. The JSON pages are of version 1.1 of the API (PEP 700), with
+the versions of the project and the size of every file.
+"""
+from __future__ import annotations
+
+import html
+import json
+import os
+from pathlib import Path
+
+from .common import normalise_core_metadata_name
+
+__all__ = ["WheelhouseIndex"]
+
+API_VERSION = "1.1"
+
+PAGE_TEMPLATE = """\
+<!DOCTYPE html>
+<html>
+  <head>
+    <meta name="pypi:repository-version" content="{version}">
+    <title>{title}</title>
+  </head>
+  <body>
+    <h1>{title}</h1>
+{links}
+  </body>
+</html>
+"""
+
+
+def __dir__() -> list[str]:
+    return __all__
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    tmp_path = path.with_name(path.name + '.tmp')
+    tmp_path.write_text(text, encoding='utf-8')
+    os.replace(tmp_path, path)
+
+
+def _link(href: str, text: str, attributes: dict[str, str]) -> str:
+    attrs = ''.join(
+        ' {}="{}"'.format(name, html.escape(value)) for name, value in attributes.items()
+    )
+    return '    <a href="{}"{}>{}</a><br>'.format(html.escape(href), attrs, html.escape(text))
+
+
+class WheelhouseIndex:
+    """A simple repository in ``directory``, for wheels stored anywhere"""
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+
+    def _load(self, page: Path) -> dict:
+        try:
+            with open(page, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def add(
+        self,
+        project: str,
+        wheel_path: Path,
+        sha256: str,
+        requires_python: str | None = None,
+        metadata_sha256: str | None = None,
+    ) -> None:
+        """Add a wheel, given the hex digests of it and its metadata sidecar"""
+        name = normalise_core_metadata_name(project)
+        project_dir = self.directory / name
+        project_dir.mkdir(parents=True, exist_ok=True)
+        url = Path(os.path.relpath(wheel_path, project_dir)).as_posix()
+        entry = {
+            'filename': wheel_path.name,
+            'url': url,
+            'hashes': {'sha256': sha256},
+            'size': wheel_path.stat().st_size,
+        }
+        if requires_python:
+            entry['requires-python'] = requires_python
+        if metadata_sha256:
+            entry['core-metadata'] = {'sha256': metadata_sha256}
+
+        page = self._load(project_dir / 'index.json')
+        files = []
+        for f in page.get('files', []):
+            if f['filename'] == wheel_path.name:
+                continue
+            if 'size' not in f:
+                # Listed by a page of API version 1.0
+                try:
+                    f['size'] = (project_dir / f['url']).stat().st_size
+                except OSError:
+                    continue
+            files.append(f)
+        files.append(entry)
+        files.sort(key=lambda f: f['filename'])
+        # Only wheels are added, named {name}-{version}-...-{platform}.whl
+        versions = sorted({f['filename'].split('-')[1] for f in files})
+        page = {
+            'meta': {'api-version': API_VERSION},
+            'name': name,
+            'versions': versions,
+            'files': files,
+        }
+        _write_atomic(project_dir / 'index.json', json.dumps(page, indent=2) + '\n')
+        _write_atomic(project_dir / 'index.html', self._project_page(page))
+
+        projects = self._load(self.directory / 'index.json').get('projects', [])
+        if name not in {p['name'] for p in projects}:
+            projects = sorted(projects + [{'name': name}], key=lambda p: p['name'])
+            root = {'meta': {'api-version': API_VERSION}, 'projects': projects}
+            _write_atomic(self.directory / 'index.json', json.dumps(root, indent=2) + '\n')
+            _write_atomic(self.directory / 'index.html', PAGE_TEMPLATE.format(
+                version=API_VERSION, title='Simple index', links='\n'.join(
+                    _link(p['name'] + '/', p['name'], {}) for p in projects
+                ),
+            ))
+
+    @staticmethod
+    def _project_page(page: dict) -> str:
+        links = []
+        for f in page['files']:
+            attributes = {}
+            if 'requires-python' in f:
+                attributes['data-requires-python'] = f['requires-python']
+            if 'core-metadata' in f:
+                value = 'sha256=' + f['core-metadata']['sha256']
+                attributes['data-core-metadata'] = value
+                attributes['data-dist-info-metadata'] = value
+            links.append(_link(
+                '{}#sha256={}'.format(f['url'], f['hashes']['sha256']),
+                f['filename'], attributes,
+            ))
+        return PAGE_TEMPLATE.format(
+            version=API_VERSION, title='Links for ' + page['name'], links='\n'.join(links),
+        )
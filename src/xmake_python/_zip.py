@@ -0,0 +1,447 @@
+"""Low level helpers for writing wheel archives.
+
+zipfile only knows how to compress a member while it is being written, on
+the thread which owns the archive. The helpers here split that in two: the
+payload of a member is prepared (read, hashed and deflated) independently,
+and later appended to the archive as a ready-made entry. The bytes written
+are exactly what :meth:`zipfile.ZipFile.open` would have produced.
+"""
+from __future__ import annotations
+
+import errno
+import hashlib
+import io
+import mmap
+import os
+import struct
+import time
+import zipfile
+import zlib
+from typing import TYPE_CHECKING
+
+import pathspec
+
+from ._deflate import ZLIB, DeflateBackend
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable
+
+__all__ = [
+    "CompressionPolicy",
+    "WheelZipFile",
+    "compress_data",
+    "compress_file",
+    "member_data_offset",
+    "read_file",
+    "zinfo_from_stat",
+]
+
+# Files up to this size are read with a single read() call, larger ones are
+# memory mapped and processed CHUNK_SIZE bytes at a time.
+MMAP_THRESHOLD = 4 * 1024 * 1024
+CHUNK_SIZE = 4 * 1024 * 1024
+
+# Stored files from this size are copied into the archive by the kernel
+ZERO_COPY_THRESHOLD = MMAP_THRESHOLD
+
+# Members larger than this are never held in memory: they are streamed into
+# the archive by the thread which writes it, instead of a worker
+STREAM_THRESHOLD = 64 * 1024 * 1024
+
+# Compression level 0 means that a member is stored, not deflated
+STORED = 0
+# How much of a file is deflated to guess whether compressing it is worth it
+AUTO_SAMPLE_SIZE = 64 * 1024
+# Files whose sample doesn't shrink by this ratio are stored
+AUTO_MIN_SAVING = 0.1
+
+
+def __dir__() -> list[str]:
+    return __all__
+
+
+def zinfo_from_stat(
+    arcname: str,
+    st: os.stat_result,
+    date_time: tuple[int, int, int, int, int, int] | None = None,
+) -> zipfile.ZipInfo:
+    """Like ZipInfo.from_file(), but from a stat result the caller already has
+
+    ``date_time`` overrides the modification time of the file.
+    """
+    if date_time is None:
+        date_time = time.localtime(st.st_mtime)[:6]
+    zinfo = zipfile.ZipInfo(arcname, date_time)
+    zinfo.file_size = st.st_size
+    return zinfo
+
+
+def read_file(path: str, size: int, process: Callable[[bytes], None]) -> None:
+    """Feed the content of a file to process() in as few buffers as possible
+
+    ``size`` is the size of the file as given by a previous stat. Small files
+    are read in one call, large files are memory mapped so that no copy of
+    the data is made in userspace. The buffers passed to process() are only
+    valid for the duration of the call.
+    """
+    fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        if size < MMAP_THRESHOLD:
+            while True:
+                buf = os.read(fd, max(size, CHUNK_SIZE // 16))
+                if not buf:
+                    break
+                process(buf)
+                if len(buf) == size:
+                    # Got everything the stat promised, skip the extra read
+                    break
+                size = 0
+            return
+
+        with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as m:
+            if hasattr(m, 'madvise'):
+                m.madvise(mmap.MADV_SEQUENTIAL)
+            view = memoryview(m)
+            try:
+                for start in range(0, len(m), CHUNK_SIZE):
+                    process(view[start:start + CHUNK_SIZE])
+            finally:
+                view.release()
+    finally:
+        os.close(fd)
+
+
+class CompressionPolicy:
+    """Choose how each member of a wheel is compressed
+
+    ``level`` is a zlib level, -1 being zlib's default and 0 meaning the
+    member is stored. Members matching one of the ``store`` patterns are
+    stored, otherwise the first of the ``levels`` patterns matching a member
+    gives its level. Patterns are gitignore-style globs matched against the
+    path in the archive. With ``auto``, members are also stored when a
+    sample of their content hardly compresses. Members are deflated with
+    ``backend``.
+    """
+    def __init__(
+        self,
+        level: int = zlib.Z_DEFAULT_COMPRESSION,
+        store: Iterable[str] = (),
+        levels: Iterable[tuple[str, int]] = (),
+        auto: bool = False,
+        backend: DeflateBackend = ZLIB,
+    ):
+        self.level = level
+        self.store = pathspec.GitIgnoreSpec.from_lines(list(store))
+        self.levels = [
+            (pathspec.GitIgnoreSpec.from_lines([pattern]), lvl)
+            for pattern, lvl in levels
+        ]
+        self.auto = auto
+        self.backend = backend
+
+    def level_for(self, arcname: str) -> int:
+        if self.store.match_file(arcname):
+            return STORED
+        for spec, level in self.levels:
+            if spec.match_file(arcname):
+                return level
+        return self.level
+
+
+def is_compressible(path: str, size: int, backend: DeflateBackend = ZLIB) -> bool:
+    """Guess from a sample of a file whether deflating it is worth it"""
+    if size < AUTO_SAMPLE_SIZE // 16:
+        return True
+    with open(path, 'rb') as f:
+        sample = f.read(AUTO_SAMPLE_SIZE)
+    return len(backend.compress(sample, 1)) < len(sample) * (1 - AUTO_MIN_SAVING)
+
+
+class _Deflater:
+    """Hash, checksum and compress a stream of buffers in one pass"""
+    def __init__(self, write: Callable[[bytes], None], level: int,
+                 backend: DeflateBackend = ZLIB):
+        self.write = write
+        self.hashsum = hashlib.sha256()
+        self.compressor = None
+        if level != STORED:
+            # Same parameters as zipfile uses for ZIP_DEFLATED
+            self.compressor = backend.compressobj(level)
+        self.crc32 = backend.crc32
+        self.crc = 0
+        self.size = 0
+        self.compress_size = 0
+
+    def __call__(self, buf: bytes) -> None:
+        self.hashsum.update(buf)
+        self.crc = self.crc32(buf, self.crc)
+        self.size += len(buf)
+        if self.compressor is None:
+            self._write(buf)
+        else:
+            self._write(self.compressor.compress(buf))
+
+    def _write(self, data: bytes) -> None:
+        if data:
+            self.compress_size += len(data)
+            self.write(data)
+
+    def flush(self, zinfo: zipfile.ZipInfo) -> None:
+        """Finish the stream and describe it in zinfo"""
+        if self.compressor is not None:
+            self._write(self.compressor.flush())
+        zinfo.CRC = self.crc
+        zinfo.file_size = self.size
+        zinfo.compress_size = self.compress_size
+
+
+def _choose_level(zinfo, path, level, auto, backend=ZLIB):
+    if auto and level != STORED and not is_compressible(path, zinfo.file_size, backend):
+        level = STORED
+    zinfo.compress_type = zipfile.ZIP_STORED if level == STORED else zipfile.ZIP_DEFLATED
+    return level
+
+
+def _checksum_file(zinfo: zipfile.ZipInfo, path: str, backend: DeflateBackend = ZLIB) -> bytes:
+    """Fill in the CRC and sizes of a stored member, return its sha256 digest"""
+    deflater = _Deflater(lambda buf: None, STORED, backend)
+    read_file(path, zinfo.file_size, deflater)
+    deflater.flush(zinfo)
+    return deflater.hashsum.digest()
+
+
+def _zero_copy(zinfo: zipfile.ZipInfo, level: int) -> bool:
+    return level == STORED and zinfo.file_size >= ZERO_COPY_THRESHOLD
+
+
+def _kernel_copy(src_fd: int, offset: int, dst_fd: int, dst_offset: int,
+                 length: int) -> int:
+    """Copy a range of a file to another without going through userspace
+
+    Uses copy_file_range() and then sendfile() where available. Returns how
+    many bytes could be copied, the rest is left to the caller.
+    """
+    copied = 0
+    if hasattr(os, 'copy_file_range'):
+        try:
+            while copied < length:
+                n = os.copy_file_range(
+                    src_fd, dst_fd, length - copied,
+                    offset + copied, dst_offset + copied,
+                )
+                if not n:
+                    return copied
+                copied += n
+            return copied
+        except OSError as e:
+            # e.g. across filesystems on older kernels
+            if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL,
+                               errno.EOPNOTSUPP, errno.EPERM):
+                raise
+    if hasattr(os, 'sendfile') and not os.name == 'nt':
+        try:
+            # sendfile() writes at the current position of dst_fd
+            os.lseek(dst_fd, dst_offset + copied, os.SEEK_SET)
+            while copied < length:
+                n = os.sendfile(dst_fd, src_fd, offset + copied, length - copied)
+                if not n:
+                    break
+                copied += n
+        except OSError as e:
+            if e.errno not in (errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                raise
+    return copied
+
+
+def compress_file(
+    zinfo: zipfile.ZipInfo,
+    path: str,
+    level: int = zlib.Z_DEFAULT_COMPRESSION,
+    auto: bool = False,
+    backend: DeflateBackend = ZLIB,
+) -> tuple[bytes, bytes]:
+    """Read, hash and compress a file in one pass.
+
+    Fills in the compression type, CRC and sizes of ``zinfo``, whose
+    ``file_size`` must hold the size of the file from stat. Returns the
+    compressed data and the sha256 digest of the file. zlib and hashlib
+    release the GIL on large buffers, so this is meant to be run from a
+    thread pool. ``backend`` is the deflate implementation to use.
+
+    The data of large stored members isn't returned, only None: they are
+    meant to be copied from the file by WheelZipFile.copy_file().
+    """
+    level = _choose_level(zinfo, path, level, auto, backend)
+    if _zero_copy(zinfo, level):
+        return None, _checksum_file(zinfo, path, backend)
+    chunks = []
+    deflater = _Deflater(chunks.append, level, backend)
+    read_file(path, zinfo.file_size, deflater)
+    deflater.flush(zinfo)
+    return b''.join(chunks), deflater.hashsum.digest()
+
+
+def compress_data(
+    zinfo: zipfile.ZipInfo,
+    data: bytes,
+    level: int = zlib.Z_DEFAULT_COMPRESSION,
+    backend: DeflateBackend = ZLIB,
+) -> tuple[bytes, bytes]:
+    """Like compress_file(), for generated data already in memory"""
+    chunks = []
+    _choose_level(zinfo, None, level, False)
+    deflater = _Deflater(chunks.append, level, backend)
+    deflater(data)
+    deflater.flush(zinfo)
+    return b''.join(chunks), deflater.hashsum.digest()
+
+
+def member_data_offset(fp, zinfo: zipfile.ZipInfo) -> int:
+    """Find where the raw data of a member starts in an existing archive"""
+    fp.seek(zinfo.header_offset)
+    header = fp.read(zipfile.sizeFileHeader)
+    if len(header) != zipfile.sizeFileHeader:
+        raise zipfile.BadZipFile("Truncated file header")
+    fheader = struct.unpack(zipfile.structFileHeader, header)
+    if fheader[zipfile._FH_SIGNATURE] != zipfile.stringFileHeader:
+        raise zipfile.BadZipFile("Bad magic number for file header")
+    return (
+        zinfo.header_offset + zipfile.sizeFileHeader
+        + fheader[zipfile._FH_FILENAME_LENGTH]
+        + fheader[zipfile._FH_EXTRA_FIELD_LENGTH]
+    )
+
+
+class WheelZipFile(zipfile.ZipFile):
+    """A ZipFile which can also take members compressed elsewhere"""
+
+    def _begin_member(self, zinfo: zipfile.ZipInfo) -> bool:
+        """Write the local header of a new member, return whether it is ZIP64"""
+        if self._writing:
+            raise ValueError("Can't write to the ZIP file while there is "
+                             "another write handle open on it.")
+        zinfo.flag_bits = 0x00
+        if not zinfo.external_attr:
+            zinfo.external_attr = 0o600 << 16  # permissions: ?rw-------
+
+        # Same rule as ZipFile.open(), so the headers come out identical
+        zip64 = zinfo.file_size * 1.05 > zipfile.ZIP64_LIMIT
+        if zip64 and not self._allowZip64:
+            raise zipfile.LargeZipFile(
+                "Filesize would require ZIP64 extensions"
+            )
+
+        if self._seekable:
+            self.fp.seek(self.start_dir)
+        zinfo.header_offset = self.fp.tell()
+        self._writecheck(zinfo)
+        self._didModify = True
+
+        self.fp.write(zinfo.FileHeader(zip64))
+        return zip64
+
+    def _end_member(self, zinfo: zipfile.ZipInfo) -> None:
+        self.start_dir = self.fp.tell()
+        self.filelist.append(zinfo)
+        self.NameToInfo[zinfo.filename] = zinfo
+
+    def write_compressed(self, zinfo: zipfile.ZipInfo, data: bytes) -> None:
+        """Append a member whose payload is already compressed.
+
+        ``zinfo`` must have ``compress_type``, ``CRC``, ``file_size`` and
+        ``compress_size`` filled in to describe ``data``.
+        """
+        zip64 = self._begin_member(zinfo)
+        if not zip64 and zinfo.compress_size > zipfile.ZIP64_LIMIT:
+            raise RuntimeError("Compressed size too large")
+        self.fp.write(data)
+        self._end_member(zinfo)
+
+    def _copy_fd(self, src_fd: int, offset: int, length: int) -> None:
+        """Append a range of another file to the archive"""
+        try:
+            dst_fd = self.fp.fileno()
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            dst_fd = None
+        if dst_fd is not None:
+            self.fp.flush()
+            pos = self.fp.tell()
+            copied = _kernel_copy(src_fd, offset, dst_fd, pos, length)
+            # Let the file object know where the data ends
+            self.fp.seek(pos + copied)
+            offset += copied
+            length -= copied
+
+        os.lseek(src_fd, offset, os.SEEK_SET)
+        while length:
+            buf = os.read(src_fd, min(length, CHUNK_SIZE))
+            if not buf:
+                raise OSError("File was truncated while being copied")
+            self.fp.write(buf)
+            length -= len(buf)
+
+    def copy_compressed(self, zinfo: zipfile.ZipInfo, src) -> None:
+        """Like write_compressed(), but read the data from a file object
+
+        ``src`` must be positioned at the start of the data.
+        """
+        zip64 = self._begin_member(zinfo)
+        if not zip64 and zinfo.compress_size > zipfile.ZIP64_LIMIT:
+            raise RuntimeError("Compressed size too large")
+        self._copy_fd(src.fileno(), src.tell(), zinfo.compress_size)
+        self._end_member(zinfo)
+
+    def copy_file(self, zinfo: zipfile.ZipInfo, path: str) -> None:
+        """Append a stored member, copying its data straight from a file
+
+        ``zinfo`` must describe the file as compress_file() does.
+        """
+        fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        try:
+            zip64 = self._begin_member(zinfo)
+            if not zip64 and zinfo.compress_size > zipfile.ZIP64_LIMIT:
+                raise RuntimeError("File size too large")
+            self._copy_fd(fd, 0, zinfo.compress_size)
+        finally:
+            os.close(fd)
+        self._end_member(zinfo)
+
+    def write_file(
+        self,
+        zinfo: zipfile.ZipInfo,
+        path: str,
+        level: int = zlib.Z_DEFAULT_COMPRESSION,
+        auto: bool = False,
+        backend: DeflateBackend = ZLIB,
+    ) -> bytes:
+        """Stream a file into a new member, return its sha256 digest
+
+        ``zinfo.file_size`` must hold the size of the file from stat. See
+        compress_file() for ``level``, ``auto`` and ``backend``.
+        """
+        if not self._seekable:
+            # The header is written before the data and fixed up afterwards
+            raise ValueError("write_file() needs a seekable archive")
+        # Size and CRC are overwritten with correct data afterwards
+        zinfo.compress_size = 0
+        zinfo.CRC = 0
+        level = _choose_level(zinfo, path, level, auto, backend)
+        if _zero_copy(zinfo, level):
+            # Checksum through a memory map, then let the kernel copy
+            digest = _checksum_file(zinfo, path, backend)
+            self.copy_file(zinfo, path)
+            return digest
+        zip64 = self._begin_member(zinfo)
+        deflater = _Deflater(self.fp.write, level, backend)
+        read_file(path, zinfo.file_size, deflater)
+        deflater.flush(zinfo)
+
+        if not zip64 and max(zinfo.file_size, zinfo.compress_size) > zipfile.ZIP64_LIMIT:
+            raise RuntimeError("File size too large")
+
+        end = self.fp.tell()
+        self.fp.seek(zinfo.header_offset)
+        self.fp.write(zinfo.FileHeader(zip64))
+        self.fp.seek(end)
+        self._end_member(zinfo)
+        return deflater.hashsum.digest()
@@ -487,6 +487,19 @@ def dist_info_name(distribution, version):
     return normalize_dist_name(distribution, version) + '.dist-info'
 
 
+def get_config_setting(config_settings, key, default=None):
+    """Get a PEP 517 config setting, the last one wins if given many times"""
+    value = (config_settings or {}).get(key, default)
+    if isinstance(value, list):
+        value = value[-1] if value else default
+    return value
+
+
+def cache_dir(directory):
+    """Directory keeping state between builds of the project in directory"""
+    return Path(directory) / 'build' / 'xmake-python'
+
+
 def walk_data_dir(data_directory):
     """Iterate over the files in the given data directory.
 
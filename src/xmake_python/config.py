@@ -12,6 +12,8 @@ try:
 except ImportError:
     import tomli as tomllib
 
+from ._deflate import BACKENDS
+from ._elf import ACTIONS
 from ._spdx_data import licenses
 from .common import normalise_core_metadata_name
 from .versionno import normalise_version
@@ -130,7 +132,8 @@ def prep_toml_config(d, path):
         )
 
     unknown_sections = set(dtool) - {
-        'metadata', 'module', 'scripts', 'entrypoints', 'sdist', 'external-data', 'xmaker', 'maker'
+        'metadata', 'module', 'scripts', 'entrypoints', 'sdist', 'wheel',
+        'external-data', 'xmaker', 'maker', 'distributions'
     }
     unknown_sections = [s for s in unknown_sections if not s.lower().startswith('x-')]
     if unknown_sections:
@@ -138,8 +141,11 @@ def prep_toml_config(d, path):
             '[tool.xmake.{}]'.format(s) for s in unknown_sections
         ))
 
+    if 'distributions' in dtool:
+        loaded_cfg.distributions = _check_distributions(dtool['distributions'], loaded_cfg)
+
     if 'sdist' in dtool:
-        unknown_keys = set(dtool['sdist']) - {'include', 'exclude'}
+        unknown_keys = set(dtool['sdist']) - {'include', 'exclude', 'deflate-backend'}
         if unknown_keys:
             raise ConfigError(
                 "Unknown keys in [tool.xmake.sdist]:" + ", ".join(unknown_keys)
@@ -155,6 +161,72 @@ def prep_toml_config(d, path):
         loaded_cfg.sdist_exclude_patterns = _check_glob_patterns(
             exclude, 'exclude'
         )
+        loaded_cfg.sdist_deflate_backend = read_deflate_backend(
+            dtool['sdist'].get('deflate-backend', 'auto'),
+            'tool.xmake.sdist.deflate-backend',
+        )
+
+    if 'wheel' in dtool:
+        unknown_keys = set(dtool['wheel']) - {
+            'jobs', 'compression', 'incremental', 'pipeline', 'deflate-backend',
+            'compile-bytecode', 'metadata-sidecar', 'layout', 'exclude', 'include',
+            'debug-info', 'vendor-libs', 'size-report',
+        }
+        if unknown_keys:
+            raise ConfigError(
+                "Unknown keys in [tool.xmake.wheel]:" + ", ".join(unknown_keys)
+            )
+
+        jobs = dtool['wheel'].get('jobs', 1)
+        if not isinstance(jobs, int) or isinstance(jobs, bool) or jobs < 0:
+            raise ConfigError(
+                "tool.xmake.wheel.jobs must be a non-negative integer"
+            )
+        loaded_cfg.wheel_jobs = jobs
+        incremental = dtool['wheel'].get('incremental', False)
+        if not isinstance(incremental, bool):
+            raise ConfigError("tool.xmake.wheel.incremental must be a boolean")
+        loaded_cfg.wheel_incremental = incremental
+        pipeline = dtool['wheel'].get('pipeline', False)
+        if not isinstance(pipeline, bool):
+            raise ConfigError("tool.xmake.wheel.pipeline must be a boolean")
+        loaded_cfg.wheel_pipeline = pipeline
+        loaded_cfg.wheel_deflate_backend = read_deflate_backend(
+            dtool['wheel'].get('deflate-backend', 'auto'),
+            'tool.xmake.wheel.deflate-backend',
+        )
+        metadata_sidecar = dtool['wheel'].get('metadata-sidecar', False)
+        if not isinstance(metadata_sidecar, bool):
+            raise ConfigError("tool.xmake.wheel.metadata-sidecar must be a boolean")
+        loaded_cfg.wheel_metadata_sidecar = metadata_sidecar
+        for key in ('exclude', 'include'):
+            patterns = dtool['wheel'].get(key, [])
+            if not isinstance(patterns, list) or not all(isinstance(p, str) for p in patterns):
+                raise ConfigError(
+                    "tool.xmake.wheel.{} must be a list of patterns".format(key)
+                )
+            setattr(loaded_cfg, 'wheel_' + key, patterns)
+        loaded_cfg.wheel_debug_info.update(
+            _check_debug_info(dtool['wheel'].get('debug-info', {}))
+        )
+        loaded_cfg.wheel_vendor_libs.update(
+            _check_vendor_libs(dtool['wheel'].get('vendor-libs', {}))
+        )
+        loaded_cfg.wheel_size_report.update(
+            _check_size_report(dtool['wheel'].get('size-report', {}))
+        )
+        layout = dtool['wheel'].get('layout', 'default')
+        if layout not in ('default', 'metadata-last'):
+            raise ConfigError(
+                "tool.xmake.wheel.layout must be 'default' or 'metadata-last'"
+            )
+        loaded_cfg.wheel_layout = layout
+        loaded_cfg.wheel_compile_bytecode = _check_optimize_levels(
+            dtool['wheel'].get('compile-bytecode', False)
+        )
+        loaded_cfg.wheel_compression.update(
+            _check_compression(dtool['wheel'].get('compression', {}))
+        )
 
     data_dir = dtool.get('external-data', {}).get('directory', None)
     if data_dir is not None:
@@ -247,6 +319,203 @@ def _check_glob_patterns(pats, clude):
     return normed
 
 
+compression_presets = {
+    'store': 0,
+    'fast': 1,
+    'default': -1,
+    'max': 9,
+}
+
+
+def read_compression_level(level, toml_key):
+    """Convert a compression level or preset name to a zlib level"""
+    if isinstance(level, str) and level in compression_presets:
+        return compression_presets[level]
+    if isinstance(level, str):
+        try:
+            level = int(level)
+        except ValueError:
+            pass
+    if not isinstance(level, int) or isinstance(level, bool) or not -1 <= level <= 9:
+        raise ConfigError(
+            "{} must be a zlib level (-1 to 9) or one of {}".format(
+                toml_key, ", ".join(compression_presets)
+            )
+        )
+    return level
+
+
+def _check_optimize_levels(levels):
+    """Check tool.xmake.wheel.compile-bytecode, true meaning level 0"""
+    if isinstance(levels, bool):
+        return [0] if levels else []
+    if not isinstance(levels, list) or not all(
+        isinstance(lvl, int) and not isinstance(lvl, bool) and 0 <= lvl <= 2
+        for lvl in levels
+    ):
+        raise ConfigError(
+            "tool.xmake.wheel.compile-bytecode must be a boolean or a list "
+            "of optimization levels (0 to 2)"
+        )
+    return sorted(set(levels))
+
+
+def _check_debug_info(tbl):
+    """Check the [tool.xmake.wheel.debug-info] table"""
+    unknown_keys = set(tbl) - {'action', 'modes', 'gc-sections'}
+    if unknown_keys:
+        raise ConfigError(
+            "Unknown keys in [tool.xmake.wheel.debug-info]:" + ", ".join(unknown_keys)
+        )
+    res = {}
+    modes = tbl.get('modes', {})
+    if not isinstance(modes, dict):
+        raise ConfigError("tool.xmake.wheel.debug-info.modes must be a table")
+    for key, action in [('action', tbl.get('action', 'keep'))] + [
+        ('modes.' + mode, action) for mode, action in modes.items()
+    ]:
+        if action not in ACTIONS:
+            raise ConfigError("tool.xmake.wheel.debug-info.{} must be one of {}".format(
+                key, ", ".join(ACTIONS)
+            ))
+    res['action'] = tbl.get('action', 'keep')
+    res['modes'] = modes
+    gc_sections = tbl.get('gc-sections', False)
+    if not isinstance(gc_sections, bool):
+        raise ConfigError("tool.xmake.wheel.debug-info.gc-sections must be a boolean")
+    res['gc-sections'] = gc_sections
+    return res
+
+
+def _check_distributions(tbl, loaded_cfg):
+    """Check the [tool.xmake.distributions.<name>] tables"""
+    res = {}
+    names = {normalise_core_metadata_name(loaded_cfg.metadata.get('name', loaded_cfg.module))}
+    for name, dist in tbl.items():
+        if not isinstance(dist, dict):
+            raise ConfigError("[tool.xmake.distributions.{}] must be a table".format(name))
+        if normalise_core_metadata_name(name) in names:
+            raise ConfigError("Distribution {} is declared twice".format(name))
+        names.add(normalise_core_metadata_name(name))
+        unknown_keys = set(dist) - {'include', 'description', 'dependencies'}
+        if unknown_keys:
+            raise ConfigError(
+                "Unknown keys in [tool.xmake.distributions.{}]:".format(name)
+                + ", ".join(unknown_keys)
+            )
+        for key in ('include', 'dependencies'):
+            value = dist.get(key, [])
+            if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+                raise ConfigError(
+                    "tool.xmake.distributions.{}.{} must be a list of strings".format(name, key)
+                )
+        if not dist.get('include'):
+            raise ConfigError(
+                "tool.xmake.distributions.{}.include must list staged files".format(name)
+            )
+        if not isinstance(dist.get('description', ''), str):
+            raise ConfigError(
+                "tool.xmake.distributions.{}.description must be a string".format(name)
+            )
+        res[name] = {
+            'include': dist['include'],
+            'description': dist.get('description'),
+            'dependencies': dist.get('dependencies', []),
+        }
+    return res
+
+
+def _check_vendor_libs(tbl):
+    """Check the [tool.xmake.wheel.vendor-libs] table"""
+    from ._vendor import POLICIES
+    unknown_keys = set(tbl) - {'enable', 'policy', 'allow'}
+    if unknown_keys:
+        raise ConfigError(
+            "Unknown keys in [tool.xmake.wheel.vendor-libs]:" + ", ".join(unknown_keys)
+        )
+    res = {}
+    if not isinstance(tbl.get('enable', False), bool):
+        raise ConfigError("tool.xmake.wheel.vendor-libs.enable must be a boolean")
+    if tbl.get('policy', 'manylinux') not in POLICIES:
+        raise ConfigError("tool.xmake.wheel.vendor-libs.policy must be one of {}".format(
+            ", ".join(POLICIES)
+        ))
+    allow = tbl.get('allow', [])
+    if not isinstance(allow, list) or not all(isinstance(p, str) for p in allow):
+        raise ConfigError("tool.xmake.wheel.vendor-libs.allow must be a list of patterns")
+    for key in ('enable', 'policy', 'allow'):
+        if key in tbl:
+            res[key] = tbl[key]
+    return res
+
+
+def _check_size_report(tbl):
+    """Check the [tool.xmake.wheel.size-report] table"""
+    unknown_keys = set(tbl) - {'enable', 'max-size', 'max-installed-size'}
+    if unknown_keys:
+        raise ConfigError(
+            "Unknown keys in [tool.xmake.wheel.size-report]:" + ", ".join(unknown_keys)
+        )
+    res = {}
+    if not isinstance(tbl.get('enable', False), bool):
+        raise ConfigError("tool.xmake.wheel.size-report.enable must be a boolean")
+    if 'enable' in tbl:
+        res['enable'] = tbl['enable']
+    for key in ('max-size', 'max-installed-size'):
+        if key not in tbl:
+            continue
+        budget = tbl[key]
+        if isinstance(budget, bool) or not isinstance(budget, int) or budget <= 0:
+            raise ConfigError(
+                "tool.xmake.wheel.size-report.{} must be a positive number of bytes".format(key)
+            )
+        res[key] = budget
+        # A budget needs the report
+        res.setdefault('enable', True)
+    return res
+
+
+def read_deflate_backend(name, toml_key):
+    """Check the name of a deflate implementation"""
+    if name not in BACKENDS:
+        raise ConfigError(
+            "{} must be one of {}".format(toml_key, ", ".join(BACKENDS))
+        )
+    return name
+
+
+def _check_compression(tbl):
+    """Check the [tool.xmake.wheel.compression] table"""
+    unknown_keys = set(tbl) - {'level', 'editable-level', 'store', 'levels', 'auto'}
+    if unknown_keys:
+        raise ConfigError(
+            "Unknown keys in [tool.xmake.wheel.compression]:" + ", ".join(unknown_keys)
+        )
+    res = {}
+    for key in ('level', 'editable-level'):
+        if key in tbl:
+            res[key] = read_compression_level(
+                tbl[key], 'tool.xmake.wheel.compression.' + key
+            )
+    store = tbl.get('store', [])
+    if not isinstance(store, list) or not all(isinstance(p, str) for p in store):
+        raise ConfigError("tool.xmake.wheel.compression.store must be a list of patterns")
+    res['store'] = store
+    levels = tbl.get('levels', {})
+    if not isinstance(levels, dict):
+        raise ConfigError("tool.xmake.wheel.compression.levels must be a table")
+    res['levels'] = [
+        (pattern, read_compression_level(
+            level, 'tool.xmake.wheel.compression.levels.' + pattern
+        ))
+        for pattern, level in levels.items()
+    ]
+    res['auto'] = tbl.get('auto', False)
+    if not isinstance(res['auto'], bool):
+        raise ConfigError("tool.xmake.wheel.compression.auto must be a boolean")
+    return res
+
+
 class LoadedConfig:
     def __init__(self):
         self.module = None
@@ -256,6 +525,27 @@ class LoadedConfig:
         self.referenced_files = []
         self.sdist_include_patterns = []
         self.sdist_exclude_patterns = []
+        self.wheel_jobs = 1
+        self.wheel_incremental = False
+        self.wheel_pipeline = False
+        self.wheel_deflate_backend = 'auto'
+        self.wheel_compile_bytecode = []
+        self.wheel_metadata_sidecar = False
+        self.wheel_layout = 'default'
+        self.wheel_exclude = []
+        self.wheel_debug_info = {'action': 'keep', 'modes': {}, 'gc-sections': False}
+        self.wheel_vendor_libs = {'enable': False, 'policy': 'manylinux', 'allow': []}
+        self.distributions = {}
+        self.wheel_size_report = {'enable': False, 'max-size': None, 'max-installed-size': None}
+        self.wheel_include = []
+        self.sdist_deflate_backend = 'auto'
+        self.wheel_compression = {
+            'level': compression_presets['default'],
+            'editable-level': compression_presets['fast'],
+            'store': [],
+            'levels': [],
+            'auto': False,
+        }
         self.dynamic_metadata = []
         self.data_directory = None
         self.dtool = {}
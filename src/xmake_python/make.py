@@ -4,6 +4,7 @@ from pathlib import Path
 from shlex import join, split
 from subprocess import run
 
+from ._kind_cache import executable_id, hash_files
 from ._logging import rich_print
 from .builder.wheel_tag import WheelTag
 
@@ -16,6 +17,8 @@ class Maker:
     project: str = ""
     version: str = ""
     makefile: str = ""
+    # Where the project is installed, tempname if not set
+    installdir: str = ""
 
     def __post_init__(self):
         self.cwd = self.project
@@ -23,6 +26,11 @@ class Maker:
         if not os.path.isfile(self.configure):
             self.configure = os.path.join(self.project, "configure")
 
+    @property
+    def root(self):
+        """The root of the staging tree"""
+        return self.installdir or self.tempname
+
     def run(self, commands, cwd=None):
         if cwd is None:
             cwd = self.cwd
@@ -46,10 +54,10 @@ class Maker:
             self.run(cmd, cwd=self.project)
         if os.path.isfile(self.configure):
             self.cwd = os.path.join(self.tempname, "build")
-            os.mkdir(self.cwd)
+            os.makedirs(self.cwd, exist_ok=True)
         text = text.format(
             project=self.cwd.replace("\\", "\\\\"),
-            root=self.tempname.replace("\\", "\\\\"),
+            root=self.root.replace("\\", "\\\\"),
             version=self.version,
             makefile=self.makefile,
         )
@@ -65,7 +73,7 @@ class Maker:
         cmd = [
             "sh",
             self.configure,
-            "--prefix=" + os.path.join(self.tempname, "data"),
+            "--prefix=" + os.path.join(self.root, "data"),
         ] + split(self.command)
         self.run(cmd, cwd=os.path.join(self.tempname, "build"))
 
@@ -82,6 +90,14 @@ class Maker:
         ]
         self.run(cmd)
 
+    def show_key(self):
+        """What show() depends on, to cache its result"""
+        return {
+            "scripts": hash_files([self.makefile, "Makefile.am"]),
+            "make": executable_id(self.make),
+            "command": self.command,
+        }
+
     def show(self):
         makefile = "Makefile.am"
         if os.path.exists(self.makefile):
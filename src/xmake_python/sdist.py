@@ -1,7 +1,6 @@
 from collections import defaultdict
 from copy import copy
 from glob import glob
-from gzip import GzipFile
 import io
 import logging
 import os
@@ -11,6 +10,7 @@ from posixpath import join as pjoin
 import tarfile
 
 from . import common
+from ._deflate import ZLIB, get_backend, open_gzip
 from ._file_processor import each_unignored_file
 
 log = logging.getLogger(__name__)
@@ -73,7 +73,8 @@ class SdistBuilder:
     which is what should normally be published to PyPI.
     """
     def __init__(self, module, metadata, cfgdir, reqs_by_extra, entrypoints,
-                 extra_files, data_directory, include_patterns=(), exclude_patterns=()):
+                 extra_files, data_directory, include_patterns=(), exclude_patterns=(),
+                 deflate=ZLIB, build_dirs=()):
         self.module = module
         self.metadata = metadata
         self.cfgdir = cfgdir
@@ -83,20 +84,37 @@ class SdistBuilder:
         self.data_directory = data_directory
         self.includes = FilePatterns(include_patterns, str(cfgdir))
         self.excludes = FilePatterns(exclude_patterns, str(cfgdir))
+        self.deflate = deflate
+        # Build directories kept between wheel builds, relative to cfgdir
+        self.build_dirs = build_dirs
 
     @classmethod
-    def from_ini_path(cls, ini_path: Path):
+    def from_ini_path(cls, ini_path: Path, config_settings=None):
         # Local import so bootstrapping doesn't try to load toml
-        from .config import read_xmake_config
+        from .config import read_xmake_config, read_deflate_backend
         ini_info = read_xmake_config(ini_path)
+        backend = common.get_config_setting(
+            config_settings, 'deflate-backend', ini_info.sdist_deflate_backend
+        )
         srcdir = ini_path.parent
         module = common.Module(ini_info.module, srcdir)
         metadata = common.make_metadata(module, ini_info)
         extra_files = [ini_path.name] + ini_info.referenced_files
+        # Where WheelBuilder builds the project, see its from_ini_path()
+        tempnames = [ini_info.dtool.get(tool, {}).get('tempname', '') for tool in ('xmaker', 'maker')]
+        build_dirs = []
+        for build_dir in [common.get_config_setting(config_settings, 'build-dir', '')] + tempnames:
+            if build_dir:
+                build_dir = osp.relpath(srcdir / build_dir, srcdir)
+                # Not if outside of the project, nothing of it would be shipped
+                if build_dir.split(os.sep)[0] not in ('.', '..'):
+                    build_dirs.append(build_dir)
         return cls(
             module, metadata, srcdir, ini_info.reqs_by_extra,
             ini_info.entrypoints, extra_files, ini_info.data_directory,
             ini_info.sdist_include_patterns, ini_info.sdist_exclude_patterns,
+            get_backend(read_deflate_backend(backend, 'deflate-backend')),
+            build_dirs,
         )
 
     def prep_entry_points(self):
@@ -114,7 +132,12 @@ class SdistBuilder:
         This is overridden in xmake itself to use information from a VCS to
         include tests, docs, etc. for a 'gold standard' sdist.
         """
-        return list(map(lambda x: str(x), each_unignored_file(Path())))
+        # Don't ship the state kept between wheel builds
+        build_dir = str(common.cache_dir('').as_posix()) + '/'
+        exclude = ['/' + Path(d).as_posix() + '/' for d in self.build_dirs]
+        return list(map(lambda x: str(x), each_unignored_file(
+            Path(), exclude=exclude, build_dir=build_dir,
+        )))
         # cfgdir_s = str(self.cfgdir)
         # return [
         #     osp.relpath(p, cfgdir_s) for p in self.module.iter_files()
@@ -169,7 +192,7 @@ class SdistBuilder:
         # For the gzip timestamp, default to 2016-1-1 00:00 (UTC)
         # This makes the sdist reproducible even without SOURCE_DATE_EPOCH,
         # if the source file mtimes don't change, i.e. from the same checkout.
-        gz = GzipFile(str(target), mode='wb', mtime=(mtime or 1451606400))
+        gz = open_gzip(str(target), mtime or 1451606400, self.deflate)
         tf = tarfile.TarFile(str(target), mode='w', fileobj=gz,
                              format=tarfile.PAX_FORMAT)
 
@@ -0,0 +1,28 @@
+-- Configure, build and install the project in one xmake process
+--
+-- $ xmake lua -P <tempname> driver.lua '<options of xmake config as JSON>' <configure> \
+--     <root> <manifest>
+--
+-- The config task is skipped when configure is false, the build tree being
+-- configured already. The project is installed into root, the staging tree.
+--
+-- The installed files are written to manifest as a JSON list of their paths
+-- in the staging tree, for WheelBuilder, which knows where each directory of
+-- the staging tree goes in the wheel.
+import("core.base.json")
+import("core.base.task")
+
+function main(options, configure, root, manifest)
+    if configure ~= "false" then
+        task.run("config", json.decode(options))
+    end
+    task.run("build")
+    task.run("install", {installdir = root})
+    local installed = {}
+    for _, dir in ipairs({"platlib", "data", "metadata"}) do
+        for _, file in ipairs(os.files(path.join(root, dir, "**"))) do
+            table.insert(installed, path.unix(path.relative(file, root)))
+        end
+    end
+    io.writefile(manifest, json.encode(installed))
+end
@@ -0,0 +1,33 @@
+-- Print the targets of the project as JSON, for XMaker.show()
+--
+-- $ xmake lua -P <tempname> introspect.lua
+--
+-- Every target is listed with its kind, rules, packages and installed files,
+-- on a single line starting with a marker, as the project may print more.
+import("core.base.json")
+import("core.project.config")
+import("core.project.project")
+
+function main()
+    config.load()
+    local targets = {}
+    for _, target in ipairs(project.ordertargets()) do
+        local rules = {}
+        for _, r in ipairs(target:orderules()) do
+            table.insert(rules, r:name())
+        end
+        local installfiles = {}
+        local srcfiles, dstfiles = target:installfiles()
+        for i, dstfile in ipairs(table.wrap(dstfiles)) do
+            table.insert(installfiles, {src = srcfiles[i], dst = dstfile})
+        end
+        table.insert(targets, {
+            name = target:name(),
+            kind = target:kind(),
+            rules = rules,
+            packages = table.wrap(target:get("packages")),
+            installfiles = installfiles,
+        })
+    end
+    print("xmake-python-targets: " .. json.encode(targets))
+end
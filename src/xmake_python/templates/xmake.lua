@@ -39,6 +39,18 @@ option("datadir")
 do
     set_default("../data/share")
 end
+option("gc_sections")
+do
+    set_default(false)
+end
 option_end()
 set_prefixdir("data", {{bindir = "bin", libdir = "lib", includedir = "include"}})
+-- Let a GNU compatible linker drop unused sections of functions and data,
+-- added to the flags of the project rather than replacing them
+if has_config("gc_sections") and not is_plat("macosx", "iphoneos", "watchos", "windows") then
+    local gnu = {{tools = {{"gcc", "gxx", "clang", "clangxx"}}}}
+    add_cxflags("-ffunction-sections", "-fdata-sections", gnu)
+    add_ldflags("-Wl,--gc-sections", gnu)
+    add_shflags("-Wl,--gc-sections", gnu)
+end
 includes("{project}")
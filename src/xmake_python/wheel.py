@@ -1,7 +1,10 @@
 from __future__ import annotations
 import argparse
 from base64 import urlsafe_b64encode
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import contextlib
+import copy
 from datetime import datetime, timezone
 import hashlib
 from io import StringIO
@@ -9,6 +12,7 @@ import logging
 import os
 import os.path as osp
 import stat
+import sys
 import tempfile
 from pathlib import Path
 from types import SimpleNamespace
@@ -17,6 +21,22 @@ from shutil import which
 from pathlib import Path
 
 from . import common
+from ._manifest import Manifest, ManifestEntry, PathFilter, scan_dir
+from ._pipeline import Prefetcher
+from ._vendor import DependencyCache, LibraryVendor
+from ._wheelhouse import WheelhouseIndex
+from ._record import RecordFile
+from ._size_report import SizeReport, format_size
+from ._wheel_index import WheelIndex
+from ._builddir import BuildDirectory
+from ._bytecode import compile_modules
+from ._deflate import get_backend
+from ._elf import DebugInfoSplitter, is_elf
+from ._kind_cache import KindCache
+from ._zip import (
+    STREAM_THRESHOLD, CompressionPolicy, WheelZipFile, compress_data, compress_file,
+    zinfo_from_stat,
+)
 from .templates import __version__
 from .xmake import XMaker
 from .make import Maker
@@ -31,6 +51,12 @@ Generator: xmake {version}
 Root-Is-Purelib: %s
 """.format(version=__version__)
 
+PURE_TAG = WheelTag(pyvers=["py3"], abis=["none"], archs=["any"])
+
+# At most this many bytes of members, uncompressed, are being deflated or
+# waiting to be written, as each is held in memory once compressed
+PENDING_BYTES = 128 * 1024 * 1024
+
 
 def get_build_system(xmake, makefile, configure, configure_ac):
     if xmake.exists():
@@ -46,6 +72,23 @@ def _write_wheel_file(f, tag="py3-none-any", root_is_purelib=True):
     f.write(f"Tag: {tag}\n")
 
 
+def _scan_order(staged_path):
+    """Sort key of a /-separated path, giving the order of scan_dir()"""
+    *dirs, name = staged_path.split('/')
+    # Files come before the subdirectories of their directory
+    return [(1, d) for d in dirs] + [(0, name)]
+
+
+def _hash_digest(digest):
+    """Encode a digest as written in RECORD"""
+    return urlsafe_b64encode(digest).decode('ascii').rstrip('=')
+
+
+def _compress_member(zinfo, full_path, level, auto, backend):
+    data, digest = compress_file(zinfo, full_path, level, auto, backend)
+    return data, _hash_digest(digest)
+
+
 def _set_zinfo_mode(zinfo, mode):
     # Set the bits for the mode
     zinfo.external_attr = mode << 16
@@ -75,9 +118,15 @@ def zip_timestamp_from_env() -> tuple[int, int, int, int, int, int] | None:
 
 class WheelBuilder:
     def __init__(
-            self, directory, module, metadata, entrypoints, target_fp, data_directory, xmake = None
+            self, directory, module, metadata, entrypoints, target_fp, data_directory, xmake = None,
+            *, jobs=1, compression=None, index=None, pipeline=False, bytecode=(),
+            metadata_sidecar=False, layout='default', path_filter=None,
+            debug_info='keep', vendor=None, size_budget=None, build_dir=None,
     ):
         """Build a wheel from a module/package
+
+        The keyword arguments are the options of [tool.xmake.wheel], see
+        from_ini_path().
         """
         self.directory = directory
         self.module = module
@@ -85,26 +134,74 @@ class WheelBuilder:
         self.entrypoints = entrypoints
         self.data_directory = data_directory
 
-        self.records = []
         self.source_time_stamp = zip_timestamp_from_env()
+        # Deflating threads, 0 for one per CPU, the wheel is the same anyway
+        self.jobs = jobs
+        self.compression = compression or CompressionPolicy()
+        # A WheelIndex, to reuse the members unchanged since the last build
+        self.index = index
+        # Compress staged files while the project is being installed
+        self.pipeline = pipeline
+        # Optimization levels to compile the modules at
+        self.bytecode = bytecode
+        # Write METADATA next to the wheel too (PEP 658)
+        self.metadata_sidecar = metadata_sidecar
+        # metadata-last stores METADATA, WHEEL and entry_points.txt after RECORD
+        self.layout = layout
+        self.path_filter = path_filter or PathFilter()
+        # keep, strip or split, the debug info being written to debug_output
+        self.debug_info = debug_info
+        self.debug_output = None
+        self.debug_splitter = None
+        # A LibraryVendor copying the libraries needed by ELF objects
+        self.vendor = vendor
+        # max-size and max-installed-size of the wheel, in bytes
+        self.size_budget = size_budget
+        self.size_report = None
+        self.size_diff = []
+        # Other distributions of the staging tree, and the files they take
+        self.distributions = []
+        self.staging_filter = PathFilter()
+        # Planned members written after RECORD
+        self.tail = []
+        self.prefetcher = None
+        self.manifest = Manifest()
+        # Members being deflated by the worker pool, in archive order
+        self._executor = None
+        self._workers = 1
+        self._pending = deque()
+        self._pending_bytes = 0
 
         # Open the zip file ready to write
         self.wheel_zip = None
         # skip creating wheel for get_requires_for_build_wheel()
         if target_fp is not None:
-            self.wheel_zip = zipfile.ZipFile(target_fp, 'w',
-                                 compression=zipfile.ZIP_DEFLATED)
-        self.temp = tempfile.TemporaryDirectory()
+            self.open_zip(target_fp)
+        # Kept for the next build to reuse the objects compiled in it
+        if build_dir is not None:
+            self.temp = BuildDirectory(build_dir)
+        else:
+            self.temp = tempfile.TemporaryDirectory()
         self.root = Path(self.temp.name)
         self.data = self.root / "data"
+        self.records = RecordFile(self.root / "RECORD")
         if xmake:
-            xmake.tempname = self.temp.name
+            # The project is built in the build directory, installed into root
+            xmake.tempname = self.temp.path if build_dir is not None else self.temp.name
+            xmake.installdir = self.temp.name
         self.xmake = xmake
         self.kind = 0
+        self.targets = []
+        # Paths of the staging tree listed by the build system, in scan order
+        self.installed = None
+        # Nothing to build and nothing staged, set by _stage()
+        self.pure = False
 
     @classmethod
-    def from_ini_path(cls, ini_path, target_fp):
-        from .config import read_xmake_config
+    def from_ini_path(cls, ini_path, target_fp, editable=False, config_settings=None):
+        from .config import (
+            ConfigError, read_xmake_config, read_compression_level, read_deflate_backend,
+        )
 
         xmake = None
         directory = ini_path.parent
@@ -125,7 +222,8 @@ class WheelBuilder:
                            xmaker.get("command", ""),
                            xmaker.get("tempname", ""),
                            xmaker.get("project", os.path.abspath(".")),
-                           ini_info.metadata["version"])
+                           ini_info.metadata["version"],
+                           xmaker.get("driver", False))
         elif build_system in ["make", "autotools"]:
             xmake = Maker(maker.get("make", which("make")),
                            maker.get("command", ""),
@@ -134,9 +232,107 @@ class WheelBuilder:
                            ini_info.metadata["version"],
                            maker.get("makefile", "Makefile"),
                           )
-        return cls(
-            directory, module, metadata, entrypoints, target_fp, ini_info.data_directory, xmake
+        compression = ini_info.wheel_compression
+        level = compression['editable-level' if editable else 'level']
+        level = common.get_config_setting(config_settings, 'compression-level', level)
+        backend = common.get_config_setting(
+            config_settings, 'deflate-backend', ini_info.wheel_deflate_backend
         )
+        compression = CompressionPolicy(
+            read_compression_level(level, 'compression-level'),
+            compression['store'], compression['levels'], compression['auto'],
+            get_backend(read_deflate_backend(backend, 'deflate-backend')),
+        )
+        debug_info = ini_info.wheel_debug_info
+        if debug_info['gc-sections'] and build_system == "xmake":
+            # An option of templates/xmake.lua, keeping the flags of the project
+            xmake.command += " --gc_sections=y"
+        mode = getattr(xmake, "mode", "release")
+        debug_action = debug_info['modes'].get(mode, debug_info['action'])
+        vendor = None
+        if ini_info.wheel_vendor_libs['enable']:
+            vendor_libs = ini_info.wheel_vendor_libs
+            vendor = LibraryVendor(
+                None, vendor_libs['policy'], vendor_libs['allow'],
+                DependencyCache(common.cache_dir(directory) / 'elf-deps.json'),
+            )
+        size_budget = None
+        if ini_info.wheel_size_report['enable']:
+            size_budget = ini_info.wheel_size_report
+        build_dir = common.get_config_setting(
+            config_settings, 'build-dir', getattr(xmake, 'tempname', '')
+        )
+        if build_dir:
+            # The build system runs in it, a relative path would be resolved twice
+            build_dir = (directory / build_dir).resolve()
+            # The build system would write its files over those of the project
+            if Path(directory).resolve().is_relative_to(build_dir):
+                raise ConfigError(
+                    "build-dir {} must not contain the project".format(build_dir)
+                )
+        else:
+            build_dir = None
+        index = None
+        if ini_info.wheel_incremental:
+            index = WheelIndex(common.cache_dir(directory) / (
+                'wheel-' + common.normalise_core_metadata_name(metadata.name)
+            ), compression.backend.name)
+        builder = cls(
+            directory, module, metadata, entrypoints, target_fp, ini_info.data_directory, xmake,
+            jobs=ini_info.wheel_jobs, compression=compression, index=index,
+            pipeline=ini_info.wheel_pipeline, bytecode=ini_info.wheel_compile_bytecode,
+            metadata_sidecar=ini_info.wheel_metadata_sidecar, layout=ini_info.wheel_layout,
+            path_filter=PathFilter(ini_info.wheel_exclude, ini_info.wheel_include),
+            debug_info=debug_action, vendor=vendor, size_budget=size_budget,
+            build_dir=build_dir,
+        )
+        if not editable:
+            for name, distribution in ini_info.distributions.items():
+                builder.add_distribution(common.Metadata({
+                    'name': name,
+                    'version': metadata.version,
+                    'summary': distribution['description'],
+                    'requires_python': metadata.requires_python,
+                    'requires_dist': distribution['dependencies'],
+                }), distribution['include'])
+        return builder
+
+    def open_zip(self, target_fp):
+        self.wheel_zip = WheelZipFile(target_fp, 'w', compression=zipfile.ZIP_DEFLATED)
+
+    def add_distribution(self, metadata, include):
+        """Package the staged files matching include as another distribution
+
+        The project is built and installed once, the files matching the
+        gitignore-style patterns of include, relative to the staging tree
+        (e.g. ``platlib/example_plugins/``), go into the wheel of the new
+        builder rather than into this one. Open its zip with open_zip().
+        """
+        other = WheelBuilder(
+            self.directory, self.module, metadata, {}, None, None, None,
+            jobs=self.jobs, compression=self.compression, bytecode=self.bytecode,
+            metadata_sidecar=self.metadata_sidecar, layout=self.layout,
+            path_filter=copy.copy(self.path_filter), debug_info=self.debug_info,
+        )
+        other.staging_filter = PathFilter(['*'], include)
+        self.distributions.append((other, include))
+        self.staging_filter = PathFilter(
+            [pattern for _, patterns in self.distributions for pattern in patterns]
+        )
+        return other
+
+    def _share_staging(self, staged):
+        """Take the files of another builder's staging tree"""
+        self.root = staged.root
+        self.data = staged.data
+        self.kind = staged.kind
+        self.installed = staged.installed
+
+    def _in_other_distribution(self, full_path):
+        if not self.staging_filter:
+            return False
+        staged_path = Path(os.path.relpath(full_path, self.root)).as_posix()
+        return self.staging_filter.excludes(staged_path)
 
     @property
     def dist_info(self):
@@ -151,6 +347,9 @@ class WheelBuilder:
 
     @property
     def wheeltag(self):
+        if self.kind == 0:
+            # What compute_best() gives for a purelib root, without probing
+            return PURE_TAG
         py_api = ""
         if self.kind == 1:
             py_api = ('py2.' if self.metadata.supports_py2 else '') + 'py3'
@@ -163,69 +362,322 @@ class WheelBuilder:
         tag = str(self.wheeltag)
         return '{}-{}.whl'.format(dist_name, tag)
 
-    def _add_file(self, full_path, rel_path):
-        log.debug("Adding %s to zip file", full_path)
+    def _add_file(self, full_path, rel_path, st=None):
+        """Plan to add a file to the wheel under rel_path"""
         full_path, rel_path = str(full_path), str(rel_path)
         if os.sep != '/':
             # We always want to have /-separated paths in the zip file and in
             # RECORD
             rel_path = rel_path.replace(os.sep, '/')
+        if st is None:
+            st = os.stat(full_path)
+        level = self.compression.level_for(rel_path)
+        self.manifest.add(ManifestEntry.from_file(rel_path, full_path, st, level))
+
+    def _add_dir(self, directory, prefix, filtered=True):
+        """Plan to add the files of a directory to the wheel under prefix"""
+        for full_path, rel_path, st in self._scan_staged(directory, prefix):
+            if self._in_other_distribution(full_path) or (filtered and self._excludes(rel_path)):
+                continue
+            self._add_file(full_path, rel_path, st)
+
+    def _excludes(self, rel_path):
+        if self.path_filter and self.path_filter.excludes(rel_path):
+            log.debug("Excluding %s from the wheel", rel_path)
+            self.path_filter.excluded += 1
+            return True
+        return False
+
+    def _write_entry(self, entry):
+        """Write a planned member to the zip"""
+        if entry.data is not None:
+            self._write_data(entry)
+            return
+        log.debug("Adding %s to zip file", entry.source)
 
-        if self.source_time_stamp is None:
-            zinfo = zipfile.ZipInfo.from_file(full_path, rel_path)
+        # The stat from planning gives the mode, timestamp and size
+        st = entry.stat
+        zinfo = self._new_zinfo(entry.arcname, st, entry.mode)
+
+        level = entry.level
+        auto = self.compression.auto
+        reused = None
+        if self.index is not None:
+            reused = self.index.lookup(entry.source, st, level, auto)
+        if reused is None and self.prefetcher is not None:
+            prefetched = self.prefetcher.take(entry.source, entry.arcname, st, level)
+            if prefetched is not None:
+                # Compressed while the project was being installed
+                self._queue((*prefetched, entry))
+                return
+        if reused is not None:
+            # Unchanged since the previous wheel, copy its compressed data
+            prev, hash_digest = reused
+            zinfo.compress_type = prev.compress_type
+            zinfo.CRC = prev.CRC
+            zinfo.file_size = prev.file_size
+            zinfo.compress_size = prev.compress_size
+
+        if self._executor is not None and not self._streams(entry, reused):
+            if reused is None:
+                future = self._executor.submit(
+                    _compress_member, zinfo, entry.source, level, auto,
+                    self.compression.backend,
+                )
+            else:
+                future = self._executor.submit(
+                    lambda: (self.index.read_member(prev), hash_digest)
+                )
+            self._queue((zinfo, future, entry))
+            return
+
+        # Keep the order of the archive
+        self._drain()
+        if reused is not None:
+            with self.index.open_member(prev) as src:
+                self.wheel_zip.copy_compressed(zinfo, src)
         else:
-            # Set timestamps in zipfile for reproducible build
-            zinfo = zipfile.ZipInfo(rel_path, self.source_time_stamp)
+            digest = self.wheel_zip.write_file(
+                zinfo, entry.source, level, auto, self.compression.backend
+            )
+            hash_digest = _hash_digest(digest)
+        self._record(zinfo, entry, hash_digest)
+
+    @staticmethod
+    def _streams(entry, reused):
+        """Whether a member is too large to be compressed in memory by a worker"""
+        # Large stored members are only checksummed by workers, then copied
+        return entry.size > STREAM_THRESHOLD and (reused is not None or entry.level != 0)
 
-        # Normalize permission bits to either 755 (executable) or 644
-        st_mode = os.stat(full_path).st_mode
-        new_mode = common.normalize_file_permissions(st_mode)
-        _set_zinfo_mode(zinfo, new_mode & 0xFFFF)  # Unix attributes
+    def _new_zinfo(self, arcname, st, mode):
+        # Set timestamps in zipfile for reproducible build if requested
+        zinfo = zinfo_from_stat(arcname, st, self.source_time_stamp)
+        _set_zinfo_mode(zinfo, mode)  # Unix attributes
 
-        if stat.S_ISDIR(st_mode):
+        if stat.S_ISDIR(st.st_mode):
             zinfo.external_attr |= 0x10  # MS-DOS directory flag
+        return zinfo
 
-        zinfo.compress_type = zipfile.ZIP_DEFLATED
+    def _record(self, zinfo, entry, hash_digest):
+        self.records.append(zinfo.filename, hash_digest, zinfo.file_size)
+        if self.index is not None and entry.source is not None:
+            self.index.add(entry.source, entry.stat, entry.level,
+                           self.compression.auto, zinfo.filename, hash_digest)
 
-        hashsum = hashlib.sha256()
-        if self.wheel_zip:
-            with open(full_path, 'rb') as src, self.wheel_zip.open(zinfo, 'w') as dst:
-                while True:
-                    buf = src.read(1024 * 8)
-                    if not buf:
-                        break
-                    hashsum.update(buf)
-                    dst.write(buf)
+    def _queue(self, member):
+        """Add a member being compressed, writing earlier ones past the window"""
+        self._pending.append(member)
+        self._pending_bytes += member[-1].size
+        # Bound the compressed members held in memory, by count and by size
+        self._drain(4 * self._workers, PENDING_BYTES)
 
-        size = os.stat(full_path).st_size
-        hash_digest = urlsafe_b64encode(hashsum.digest()).decode('ascii').rstrip('=')
-        self.records.append((rel_path, hash_digest, size))
+    def _drain(self, limit=0, max_bytes=0):
+        """Write compressed members to the zip until at most limit are pending
+
+        And until they total at most max_bytes uncompressed.
+        """
+        while len(self._pending) > limit or (self._pending and self._pending_bytes > max_bytes):
+            zinfo, future, entry = self._pending.popleft()
+            self._pending_bytes -= entry.size
+            data, hash_digest = future.result()
+            if data is None:
+                # Large stored member, only checksummed by the worker
+                self.wheel_zip.copy_file(zinfo, entry.source)
+            else:
+                self.wheel_zip.write_compressed(zinfo, data)
+            self._record(zinfo, entry, hash_digest)
+
+    @contextlib.contextmanager
+    def _deflate_pool(self):
+        if (self.jobs == 1 and not self.pipeline) or self.wheel_zip is None:
+            yield
+            return
+        self._workers = self.jobs or os.cpu_count() or 1
+        with ThreadPoolExecutor(self._workers) as executor:
+            self._executor = executor
+            try:
+                yield
+                self._drain()
+            finally:
+                self._executor = None
+                for _, future, _ in self._pending:
+                    future.cancel()
+                self._pending.clear()
+                self._pending_bytes = 0
+                if self.prefetcher is not None:
+                    self.prefetcher.cancel()
+                    self.prefetcher = None
+
+    def _staged_files(self):
+        """Iterate over the files in the staging tree, with their path in the wheel"""
+        dist_data = common.normalize_dist_name(
+            self.metadata.name, self.metadata.version
+        ) + '.data/'
+        dirs = [
+            (self.root / "platlib", ''),
+            (self.data / "bin", dist_data + 'scripts/'),
+            (self.data / "include", dist_data + 'headers/'),
+        ]
+        for name in self._data_names():
+            if name not in {"bin", "include"}:
+                dirs.append((self.data / name, dist_data + 'data/' + name + '/'))
+        for directory, prefix in dirs:
+            for full_path, rel_path, st in self._scan_staged(directory, prefix):
+                if self._in_other_distribution(full_path):
+                    continue
+                if not (self.path_filter and self.path_filter.excludes(rel_path)):
+                    yield full_path, rel_path, st
+        yield from self._scan_staged(self.root / "metadata", self.dist_info + '/')
+
+    def _scan_staged(self, directory, prefix=''):
+        """Like scan_dir(), from the files listed by the build system if it did"""
+        directory = Path(directory)
+        if self.installed is None or not directory.is_relative_to(self.root):
+            yield from scan_dir(directory, prefix)
+            return
+        base = directory.relative_to(self.root).as_posix() + '/'
+        for staged_path in self.installed:
+            if staged_path.startswith(base) and '__pycache__' not in staged_path.split('/'):
+                full_path = os.path.join(self.root, staged_path)
+                yield full_path, prefix + staged_path[len(base):], os.stat(full_path)
+
+    def _data_names(self):
+        """The directories of the staged data, e.g. share"""
+        if self.installed is not None:
+            return sorted({
+                path.split('/')[1] for path in self.installed
+                if path.startswith('data/') and path.count('/') > 1
+            })
+        try:
+            return sorted(os.listdir(self.data))
+        except FileNotFoundError:
+            return []
+
+    def _set_installed(self, paths):
+        """Use the files listed by the build system instead of walking the tree"""
+        self.installed = sorted(paths, key=_scan_order)
+
+    def vendor_libraries(self):
+        """Copy the external libraries needed by staged modules into the wheel"""
+        if self.vendor is None:
+            return
+        # Only platlib is installed at a known place relative to .libs
+        self.vendor.libs_dir = self.root / "platlib" / (self.dist_info.split('-')[0] + '.libs')
+        vendored = self.vendor.run([
+            full_path for full_path, _, _ in self._scan_staged(self.root / "platlib")
+            if is_elf(full_path)
+        ])
+        if vendored and self.installed is not None:
+            self._set_installed(self.installed + [
+                Path(os.path.relpath(dest, self.root)).as_posix() for dest in vendored.values()
+            ])
+        if vendored:
+            log.info('Vendored %d shared libraries: %s', len(vendored), ', '.join(vendored))
+
+    def strip_debug_info(self):
+        """Strip the staged ELF objects, splitting their debug info if asked"""
+        if self.debug_info == 'keep':
+            return
+        self.debug_splitter = DebugInfoSplitter(self.debug_info, self.root / "debug")
+        self.debug_splitter.run(
+            ((full_path, rel_path) for full_path, rel_path, _ in self._staged_files()
+             if not rel_path.startswith(self.dist_info + '/')),
+            self._executor,
+        )
+
+    @property
+    def debug_archive_filename(self):
+        return self.wheel_filename[:-len('.whl')] + '.debug.zip'
+
+    def write_debug_archive(self):
+        """Write the split debug info next to the wheel, as a zip archive"""
+        if self.debug_splitter is None or not self.debug_splitter.debug_files \
+                or self.debug_output is None:
+            return None
+        path = Path(self.debug_output) / self.debug_archive_filename
+        debug_dir = self.debug_splitter.debug_dir
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for debug_path in sorted(self.debug_splitter.debug_files):
+                zf.write(debug_path, debug_path.relative_to(debug_dir).as_posix())
+        log.info("Wrote debug info to %s", path)
+        return path
+
+    def _prepare_member(self, arcname, st):
+        mode = common.normalize_file_permissions(st.st_mode) & 0xFFFF
+        return self._new_zinfo(arcname, st, mode), self.compression.level_for(arcname)
+
+    @contextlib.contextmanager
+    def _prefetch(self):
+        """Compress staged files while the build system is installing them"""
+        if self._executor is None or not self.pipeline or self.debug_info != 'keep' \
+                or self.vendor is not None:
+            # Stripping would change the files after they are prefetched
+            yield
+            return
+        auto, backend = self.compression.auto, self.compression.backend
+        self.prefetcher = Prefetcher(
+            self._executor, self._staged_files, self._prepare_member,
+            lambda zinfo, path, level: _compress_member(zinfo, path, level, auto, backend),
+        )
+        with self.prefetcher:
+            yield
 
     @contextlib.contextmanager
     def _write_to_zip(self, rel_path, mode=0o644):
+        """Plan to add generated text to the wheel"""
         sio = StringIO()
         yield sio
+        self.manifest.add(self._generated_entry(rel_path, sio, mode))
 
-        log.debug("Writing data to %s in zip file", rel_path)
+    def _generated_entry(self, rel_path, sio, mode=0o644):
+        level = self.compression.level_for(rel_path)
+        # Also sets bit 0x8000 for "regular file" (S_IFREG)
+        return ManifestEntry(rel_path, mode=mode | stat.S_IFREG, level=level,
+                             data=sio.getvalue().encode('utf-8'))
+
+    def _write_data(self, entry, record=True):
+        # Keep generated files in order after any file still being deflated
+        self._drain()
+
+        log.debug("Writing data to %s in zip file", entry.arcname)
         # The default is a fixed timestamp rather than the current time, so
         # that building a wheel twice on the same computer can automatically
         # give you the exact same result.
         date_time = self.source_time_stamp or (2016, 1, 1, 0, 0, 0)
-        zi = zipfile.ZipInfo(rel_path, date_time)
-        # Also sets bit 0x8000 for "regular file" (S_IFREG)
-        _set_zinfo_mode(zi, mode | stat.S_IFREG)
-        b = sio.getvalue().encode('utf-8')
-        hashsum = hashlib.sha256(b)
-        hash_digest = urlsafe_b64encode(hashsum.digest()).decode('ascii').rstrip('=')
-        if self.wheel_zip:
-            self.wheel_zip.writestr(zi, b, compress_type=zipfile.ZIP_DEFLATED)
-        self.records.append((rel_path, hash_digest, len(b)))
+        zi = zipfile.ZipInfo(entry.arcname, date_time)
+        _set_zinfo_mode(zi, entry.mode)
+        data, digest = compress_data(zi, entry.data, entry.level, self.compression.backend)
+        self.wheel_zip.write_compressed(zi, data)
+        if record:
+            self.records.append(entry.arcname, _hash_digest(digest), len(entry.data))
 
     def copy_module(self):
         log.info('Copying package file(s) from %s', self.module.path)
+        if self.pure:
+            self.copy_module_sources()
+            return
+        self._add_dir(self.root / "platlib", '')
+
+    def copy_module_sources(self):
+        """Plan to add the files of the module straight from the source tree"""
+        for full_path in self.module.iter_files():
+            rel_path = Path(os.path.relpath(full_path, self.module.source_dir)).as_posix()
+            if not self._excludes(rel_path):
+                self._add_file(full_path, rel_path)
 
-        for full_path in common.walk_data_dir(self.root / "platlib"):
-            rel_path = os.path.relpath(full_path, self.root / "platlib")
+    def compile_bytecode(self):
+        """Plan to add the pycs of the modules planned so far"""
+        dist_data = common.normalize_dist_name(
+            self.metadata.name, self.metadata.version
+        ) + '.data/'
+        modules = [
+            (entry.arcname, entry.source) for entry in self.manifest
+            if entry.source is not None and entry.arcname.endswith('.py')
+            and not entry.arcname.startswith((dist_data, self.dist_info + '/'))
+        ]
+        log.info('Compiling %d module(s) to bytecode', len(modules))
+        for rel_path, full_path in compile_modules(
+                modules, self.root / "bytecode", self.bytecode, self.jobs):
             self._add_file(full_path, rel_path)
 
     def add_pth(self):
@@ -236,33 +688,24 @@ class WheelBuilder:
         dir_in_whl = '{}.data/data/'.format(
             common.normalize_dist_name(self.metadata.name, self.metadata.version)
         )
-        for full_path in common.walk_data_dir(self.data_directory):
-            rel_path = os.path.relpath(full_path, self.data_directory)
-            self._add_file(full_path, dir_in_whl + rel_path)
-        if not self.data.exists():
-            return
-        for name in os.listdir(self.data):
+        if self.data_directory is not None:
+            self._add_dir(self.data_directory, dir_in_whl)
+        for name in self._data_names():
             if name in {"bin", "include"}:
                 continue
-            for full_path in common.walk_data_dir(self.data / name):
-                rel_path = os.path.relpath(full_path, self.data).partition(name + os.path.sep)[2]
-                self._add_file(full_path, dir_in_whl + name + os.path.sep + rel_path)
+            self._add_dir(self.data / name, dir_in_whl + name + '/')
 
     def add_scripts_directory(self):
         dir_in_whl = '{}.data/scripts/'.format(
             common.normalize_dist_name(self.metadata.name, self.metadata.version)
         )
-        for full_path in common.walk_data_dir(Path(self.data) / "bin"):
-            rel_path = os.path.relpath(full_path, Path(self.data) / "bin")
-            self._add_file(full_path, dir_in_whl + rel_path)
+        self._add_dir(self.data / "bin", dir_in_whl)
 
     def add_headers_directory(self):
         dir_in_whl = '{}.data/headers/'.format(
             common.normalize_dist_name(self.metadata.name, self.metadata.version)
         )
-        for full_path in common.walk_data_dir(Path(self.data) / "include"):
-            rel_path = os.path.relpath(full_path, Path(self.data) / "include")
-            self._add_file(full_path, dir_in_whl + rel_path)
+        self._add_dir(self.data / "include", dir_in_whl)
 
     def write_metadata(self):
         log.info('Writing metadata files')
@@ -273,9 +716,7 @@ class WheelBuilder:
 
         for file in self.metadata.license_files:
             self._add_file(self.directory / file, '%s/licenses/%s' % (self.dist_info, file))
-        for full_path in common.walk_data_dir(self.root / "metadata"):
-            rel_path = os.path.relpath(full_path, self.root / "metadata")
-            self._add_file(full_path, '%s/%s' % (self.dist_info, rel_path))
+        self._add_dir(self.root / "metadata", self.dist_info + '/', filtered=False)
 
         with self._write_to_zip(self.dist_info + '/WHEEL') as f:
             _write_wheel_file(f, self.wheeltag, self.root_is_purelib)
@@ -283,61 +724,242 @@ class WheelBuilder:
         with self._write_to_zip(self.dist_info + '/METADATA') as f:
             self.metadata.write_metadata_file(f)
 
+    def write_manifest(self):
+        """Write all the planned members to the zip, in order"""
+        if self.index is not None:
+            self.index.load()
+        for entry in self.manifest:
+            if entry not in self.tail:
+                self._write_entry(entry)
+        self._drain()
+
     def write_record(self):
-        log.info('Writing the record of files')
-        # Write a record of the files in the wheel
-        with self._write_to_zip(self.dist_info + '/RECORD') as f:
-            for path, hash, size in self.records:
-                if path.find(',') >= 0:
-                    path = f'"{path}"'
-                f.write('{},sha256={},{}\n'.format(path, hash, size))
-            # RECORD itself is recorded with no hash or size
-            f.write(self.dist_info + '/RECORD,,\n')
+        for entry in self.tail:
+            # Written after RECORD, their hashes are known beforehand
+            hashsum = hashlib.sha256(entry.data)
+            self.records.append(entry.arcname, _hash_digest(hashsum.digest()), len(entry.data))
+        log.info('Writing the record of %d files', len(self.records))
+        arcname = self.dist_info + '/RECORD'
+        # Rows were spilled to a file as members were written, stream it
+        st = self.records.finish(arcname)
+        zinfo = zinfo_from_stat(arcname, st, self.source_time_stamp or (2016, 1, 1, 0, 0, 0))
+        _set_zinfo_mode(zinfo, 0o644 | stat.S_IFREG)
+        self.wheel_zip.write_file(zinfo, str(self.records.path),
+                                  self.compression.level_for(arcname),
+                                  backend=self.compression.backend)
+
+    def write_tail(self):
+        """Write the metadata planned last, after RECORD"""
+        for entry in self.tail:
+            self._write_data(entry, record=False)
+
+    def move_metadata_last(self):
+        """Plan the small metadata files to be stored at the end of the wheel"""
+        self.tail = []
+        for name in ('METADATA', 'WHEEL', 'entry_points.txt'):
+            entry = self.manifest.move_to_end(self.dist_info + '/' + name)
+            if entry is not None:
+                entry.level = 0
+                self.tail.append(entry)
+
+    def show(self):
+        """The kind of the wheel, cached while the build scripts don't change"""
+        cache = KindCache(common.cache_dir(self.directory) / 'kind.json')
+        key = self.xmake.show_key()
+        cached = cache.get(key)
+        if cached is not None:
+            kind, self.targets = cached
+            log.info('Kind of the wheel from %s: %d', cache.path, kind)
+            return kind
+        kind = self.xmake.show()
+        # Only xmake projects have targets
+        self.targets = getattr(self.xmake, 'targets', [])
+        cache.put(key, kind, self.targets)
+        return kind
+
+    def _stage(self):
+        """Build the project and install it into the staging tree"""
+        if self.xmake:
+            self.xmake.init()
+            self.kind = self.show()
+            self.xmake.package(self.wheeltag)
+            with self._prefetch():
+                self.xmake.install()
+            installed = getattr(self.xmake, 'installed', None)
+            if installed is not None:
+                self._set_installed(installed)
+        # A pure Python project without build system: its module is packaged
+        # from the source tree, and the empty staging tree isn't walked
+        self.pure = self.xmake is None and not any(
+            (self.root / name).exists() for name in ("platlib", "data", "metadata")
+        )
 
     def build(self, editable=False):
         try:
             with self.temp:
-                if self.xmake:
-                    self.xmake.init()
-                    self.kind = self.xmake.show()
-                    self.xmake.package(self.wheeltag)
-                    self.xmake.install()
                 try:
-                    if editable:
-                        self.add_pth()
-                    else:
-                        self.copy_module()
-                    self.add_data_directory()
-                    self.add_scripts_directory()
-                    self.add_headers_directory()
-                    self.write_metadata()
+                    with self._deflate_pool():
+                        self._stage()
+                        self.vendor_libraries()
+                        self.strip_debug_info()
+                        self.plan(editable)
+                        self.write_manifest()
                     self.write_record()
+                    self.write_tail()
+                    self.write_size_report()
+                    self.write_debug_archive()
                 finally:
+                    self.records.close()
                     if self.wheel_zip:
                         self.wheel_zip.close()
+                    if self.index is not None:
+                        self.index.close()
+                for other, _ in self.distributions:
+                    other._share_staging(self)
+                    other.build(editable)
         except PermissionError as e:
             print(e)
 
-def make_wheel_in(ini_path, wheel_directory, editable=False):
+    def plan(self, editable=False):
+        """Collect every member of the wheel in self.manifest"""
+        self.manifest = Manifest()
+        self.path_filter.excluded = 0
+        if editable:
+            self.add_pth()
+        else:
+            self.copy_module()
+            if self.bytecode:
+                self.compile_bytecode()
+        self.add_data_directory()
+        if not self.pure:
+            self.add_scripts_directory()
+            self.add_headers_directory()
+        self.write_metadata()
+        if self.path_filter.excluded:
+            log.info('Excluded %d file(s) from the wheel', self.path_filter.excluded)
+        if self.layout == 'metadata-last':
+            self.move_metadata_last()
+        return self.manifest
+
+    def write_size_report(self):
+        """Report the sizes of the files from RECORD, and check the budget"""
+        if self.size_budget is None:
+            return None
+        report = SizeReport.from_records(
+            self.wheel_filename, self.records, self.wheel_zip.NameToInfo,
+            'purelib' if self.root_is_purelib else 'platlib',
+        )
+        self.size_report = report
+        for line in report.summary():
+            log.info('%s', line)
+        path = common.cache_dir(self.directory) / (
+            'size-report-' + common.normalise_core_metadata_name(self.metadata.name) + '.json'
+        )
+        previous = SizeReport.load(path)
+        if previous is not None:
+            self.size_diff = report.diff(previous)
+            for line in self.size_diff:
+                log.info('%s', line)
+        for key, total in (('max-size', 'compressed'), ('max-installed-size', 'size')):
+            budget = self.size_budget.get(key)
+            if budget is not None and report.total[total] > budget:
+                raise ValueError("{} is over its {} budget: {} > {}".format(
+                    self.wheel_filename, key, format_size(report.total[total]),
+                    format_size(budget),
+                ))
+        report.save(path)
+        return report
+
+    def write_metadata_sidecar(self, wheel_path):
+        """Write METADATA next to the wheel, as an index serves it (PEP 658)
+
+        Returns the path of the file and its sha256 hex digest.
+        """
+        data = self.manifest.get(self.dist_info + '/METADATA').data
+        path = wheel_path.with_name(wheel_path.name + '.metadata')
+        tmp_path = path.with_name(path.name + '.tmp')
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+        return path, hashlib.sha256(data).hexdigest()
+
+    def dump_plan(self, fp, editable=False):
+        """Write the plan of the wheel, without writing it
+
+        The project is still built and staged like by build(), the staged
+        files giving most members of the wheel.
+        """
+        with self.temp:
+            self._stage()
+            self.vendor_libraries()
+            self.strip_debug_info()
+            self.plan(editable).dump(fp)
+            for other, _ in self.distributions:
+                other._share_staging(self)
+                other.plan(editable).dump(fp)
+
+def make_wheel_in(ini_path, wheel_directory, editable=False, config_settings=None,
+                  digest=False):
     # We don't know the final filename until metadata is loaded, so write to
     # a temporary_file, and rename it afterwards.
     (fd, temp_path) = tempfile.mkstemp(suffix='.whl', dir=str(wheel_directory))
+    temp_paths = [temp_path]
+    built = []
     try:
-        with open(fd, 'w+b') as fp:
-            wb = WheelBuilder.from_ini_path(ini_path, fp)
+        with open(fd, 'w+b') as fp, contextlib.ExitStack() as stack:
+            wb = WheelBuilder.from_ini_path(ini_path, fp, editable, config_settings)
+            builders = [(wb, fp)]
+            # The other distributions of the project are written along
+            for other, _ in wb.distributions:
+                (fd, path) = tempfile.mkstemp(suffix='.whl', dir=str(wheel_directory))
+                temp_paths.append(path)
+                other_fp = stack.enter_context(open(fd, 'w+b'))
+                other.open_zip(other_fp)
+                builders.append((other, other_fp))
+            for builder, _ in builders:
+                builder.debug_output = wheel_directory
             wb.build(editable)
+            for builder, f in builders:
+                sha256 = None
+                if digest:
+                    # Still in the page cache, read it back once
+                    f.seek(0)
+                    sha256 = hashlib.file_digest(f, 'sha256').hexdigest()
+                built.append((builder, sha256))
 
-        wheel_path = wheel_directory / wb.wheel_filename
-        os.replace(temp_path, str(wheel_path))
+        for (builder, sha256), path in zip(built, temp_paths):
+            wheel_path = wheel_directory / builder.wheel_filename
+            os.replace(path, str(wheel_path))
+        if wb.index is not None:
+            wb.index.save(wheel_directory / wb.wheel_filename)
     except:
-        os.unlink(temp_path)
+        for path in temp_paths:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(path)
         raise
 
-    log.info("Built wheel: %s", wheel_path)
-    return SimpleNamespace(builder=wb, file=wheel_path)
+    infos = []
+    for builder, sha256 in built:
+        wheel_path = wheel_directory / builder.wheel_filename
+        log.info("Built wheel: %s", wheel_path)
+        metadata_file = metadata_hash = None
+        if builder.metadata_sidecar:
+            metadata_file, metadata_hash = builder.write_metadata_sidecar(wheel_path)
+            log.info("Wrote %s (sha256=%s)", metadata_file, metadata_hash)
+        infos.append(SimpleNamespace(builder=builder, file=wheel_path, sha256=sha256,
+                                     metadata_file=metadata_file,
+                                     metadata_hash=metadata_hash))
+    info = infos[0]
+    # The wheels of the other distributions, like info
+    info.distributions = infos[1:]
+    return info
 
 
 def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv[:1] == ['verify']:
+        from ._verify import main as verify_main
+        sys.exit(verify_main(argv[1:]))
     parser = argparse.ArgumentParser()
     parser.add_argument(
         'srcdir',
@@ -352,13 +974,55 @@ def main(argv=None):
         '-o',
         help='output directory (defaults to {srcdir}/dist)',
     )
+    parser.add_argument(
+        '--config-setting',
+        '-C',
+        action='append',
+        default=[],
+        metavar='KEY=VALUE',
+        help='PEP 517 config setting, e.g. -C compression-level=max',
+    )
+    parser.add_argument(
+        '--index',
+        type=Path,
+        help='add the wheel to a PEP 503 simple index in this directory',
+    )
+    parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help='build the project and print the files which would go into the wheel, '
+             'without writing it',
+    )
     args = parser.parse_args(argv)
+    config_settings = {}
+    for setting in args.config_setting:
+        key, _, value = setting.partition('=')
+        config_settings[key] = value
     outdir = args.srcdir / 'dist' if args.outdir is None else Path(args.outdir)
-    print("Building wheel from", args.srcdir)
     pyproj_toml = args.srcdir / 'pyproject.toml'
+    if args.dry_run:
+        wb = WheelBuilder.from_ini_path(pyproj_toml, None, config_settings=config_settings)
+        wb.dump_plan(sys.stdout)
+        return
+    print("Building wheel from", args.srcdir)
     outdir.mkdir(parents=True, exist_ok=True)
-    info = make_wheel_in(pyproj_toml, outdir)
-    print("Wheel built", outdir / info.file.name)
+    info = make_wheel_in(pyproj_toml, outdir, config_settings=config_settings,
+                         digest=args.index is not None)
+    for wheel in [info] + info.distributions:
+        print("Wheel built", outdir / wheel.file.name)
+        if wheel.builder.debug_splitter is not None:
+            print("Stripped debug info:", wheel.builder.debug_splitter.saved, "bytes saved")
+        if wheel.builder.size_report is not None:
+            print('\n'.join(wheel.builder.size_report.summary() + wheel.builder.size_diff))
+        if wheel.metadata_file is not None:
+            print("Metadata", wheel.metadata_file, "sha256=" + wheel.metadata_hash)
+        if args.index is not None:
+            metadata = wheel.builder.metadata
+            WheelhouseIndex(args.index).add(
+                metadata.name, wheel.file.resolve(), wheel.sha256,
+                metadata.requires_python, wheel.metadata_hash,
+            )
+            print("Index updated", args.index)
 
 if __name__ == "__main__":
     main()
@@ -1,13 +1,108 @@
 import json
 import os
-from dataclasses import dataclass
+import sys
+from dataclasses import dataclass, field
 from pathlib import Path
 from shlex import join, split
 from subprocess import run
 
+from ._kind_cache import executable_id, hash_files, xmake_scripts
 from ._logging import rich_print
 from .builder.wheel_tag import WheelTag
 
+# Prefix of the line printed by templates/introspect.lua
+TARGETS_MARKER = "xmake-python-targets: "
+# Files installed by templates/driver.lua, written by it in the build tree
+INSTALLED_FILE = "xmake-python-installed.json"
+# Short options of xmake config, which take a value
+CONFIG_SHORT_OPTIONS = {"-a": "arch", "-p": "plat", "-m": "mode", "-k": "kind"}
+CONFIG_SHORT_FLAGS = {"-c": "clean", "-y": "yes", "-v": "verbose", "-D": "diagnosis"}
+# Environment variables read by xmake config, PATH giving the toolchain found
+# when CC and CXX aren't set
+CONFIG_ENV = (
+    "PATH", "CC", "CXX", "CPP", "AS", "AR", "LD", "SH", "MM", "MXX",
+    "CFLAGS", "CXXFLAGS", "CPPFLAGS", "ASFLAGS", "LDFLAGS", "SHFLAGS", "ARFLAGS",
+    "PKG_CONFIG_PATH", "SDKROOT", "MACOSX_DEPLOYMENT_TARGET", "ANDROID_NDK",
+    "VCINSTALLDIR", "XMAKE_GLOBALDIR", "XMAKE_CONFIGDIR", "XMAKE_PKG_INSTALLDIR",
+)
+# Fingerprint of the configuration, in xmake's state of the build tree
+FINGERPRINT_FILE = Path(".xmake") / "xmake-python-config.json"
+
+
+def _marked_json(output, marker):
+    """Decode the JSON of the last line of output starting with marker"""
+    for line in reversed(output.splitlines()):
+        if line.startswith(marker):
+            try:
+                return json.loads(line[len(marker):])
+            except json.decoder.JSONDecodeError:
+                return None
+    return None
+
+
+def parse_targets(output):
+    """Get the targets printed by templates/introspect.lua, None if it didn't"""
+    targets = _marked_json(output, TARGETS_MARKER)
+    if targets is None:
+        return None
+    if not targets:
+        return []
+    # Lua's empty tables are encoded as {}
+    if isinstance(targets, dict):
+        targets = list(targets.values())
+    for target in targets:
+        for key in ("rules", "packages", "installfiles"):
+            target[key] = list(target.get(key) or [])
+    return targets
+
+
+def read_installed(path):
+    """Get the paths in the staging tree written by templates/driver.lua"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            installed = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ValueError(f"xmake didn't list the files it installed: {e}") from e
+    # Lua's empty tables are encoded as {}
+    if isinstance(installed, dict):
+        installed = list(installed.values())
+    return list(installed)
+
+
+def config_options(args):
+    """The options of xmake config given by command line args, for task.run()"""
+    options = {}
+    args = list(args)
+    while args:
+        arg = args.pop(0)
+        if arg.startswith("--"):
+            name, eq, value = arg[2:].partition("=")
+            options[name] = value if eq else True
+        elif arg[:2] in CONFIG_SHORT_OPTIONS:
+            value = arg[2:] or (args.pop(0) if args else "")
+            options[CONFIG_SHORT_OPTIONS[arg[:2]]] = value
+        elif arg in CONFIG_SHORT_FLAGS:
+            options[CONFIG_SHORT_FLAGS[arg]] = True
+        else:
+            raise ValueError(f"Can't pass {arg} to xmake config in driver mode")
+    return options
+
+
+def classify_targets(targets):
+    """The kind of the wheel of a project, from its targets
+
+    0 if there are only phony targets without packages (pure Python), 2 if
+    a target has a python.* rule (extension modules), 1 otherwise.
+    """
+    kind = 0
+    for target in targets:
+        if target["kind"] == "phony" and not target["packages"]:
+            continue
+        kind = max(kind, 1)
+        if any(rule.startswith("python.") for rule in target["rules"]):
+            kind = 2
+    return kind
+
 
 @dataclass
 class XMaker:
@@ -16,6 +111,34 @@ class XMaker:
     tempname: str = ""
     project: str = ""
     version: str = ""
+    # Configure, build and install in one process running templates/driver.lua
+    driver: bool = False
+    # Where the project is installed, tempname if not set
+    installdir: str = ""
+    # Targets found by show()
+    targets: list = field(default_factory=list, repr=False)
+    # Files installed by the driver, by their path in the staging tree
+    installed: list | None = field(default=None, repr=False)
+    _config_args: list | None = field(default=None, repr=False)
+    _fingerprint: dict | None = field(default=None, repr=False)
+
+    @property
+    def mode(self):
+        """The build mode chosen by command, e.g. release or debug"""
+        args = split(self.command)
+        for i, arg in enumerate(args):
+            if arg in ("-m", "--mode") and i + 1 < len(args):
+                return args[i + 1]
+            if arg.startswith("--mode="):
+                return arg.partition("=")[2]
+            if arg.startswith("-m") and len(arg) > 2 and not arg.startswith("--"):
+                return arg[2:]
+        return "release"
+
+    @property
+    def root(self):
+        """The root of the staging tree"""
+        return self.installdir or self.tempname
 
     def init(self):
         text = ""
@@ -24,29 +147,39 @@ class XMaker:
             text = f.read()
         text = text.format(
             project=self.project.replace("\\", "\\\\"),
-            root=self.tempname.replace("\\", "\\\\"),
+            root=self.root.replace("\\", "\\\\"),
             version=self.version,
         )
-        with open(Path(self.tempname) / "xmake.lua", "w") as f:
-            f.write(text)
+        path = Path(self.tempname) / "xmake.lua"
+        # Rewriting it in a kept build directory would make xmake reload it
+        if not path.is_file() or path.read_text() != text:
+            with open(path, "w") as f:
+                f.write(text)
 
-    def run(self, commands, check: bool = True):
+    def run(self, commands, check: bool = True, capture: bool | None = None):
         cwd = self.tempname
         eol = "\n"
         if os.name == "nt":
             eol = "\r" + eol
+        # rich_print() formats its text
+        command = join(commands).replace("{", "{{").replace("}", "}}")
         rich_print(
-            f"{{bold}}$ cd {cwd}{eol}$ " + join(commands), color="green"
+            f"{{bold}}$ cd {cwd}{eol}$ " + command, color="green"
         )
+        if capture is None:
+            capture = not check
         process = run(
             commands,
             cwd=cwd,
-            check=check,
             text=True,
-            capture_output=(not check),
+            capture_output=capture,
         )
-        if not check:
+        if capture:
             print(process.stdout, end="")
+            if check and process.returncode:
+                print(process.stderr, end="", file=sys.stderr)
+        if check:
+            process.check_returncode()
         return process.stdout
 
     def package(self, wheeltag: WheelTag):
@@ -64,6 +197,11 @@ class XMaker:
         elif wheeltag.arch.endswith("i686"):
             commands = ["-a", "i386"]
 
+        if self.driver and not wheeltag.arch.endswith("universal2"):
+            # Configured and built by install()
+            self._config_args = ["-y"] + commands + split(self.command)
+            self._fingerprint = self.config_fingerprint(commands)
+            return
         if wheeltag.arch.endswith("universal2"):
             commands = ["-a", "arm64,x86_64"]
             cmd = (
@@ -78,11 +216,19 @@ class XMaker:
                 + commands
                 + split(self.command)
             )
-            self.run(cmd)
+            fingerprint = self.config_fingerprint(commands)
+            if self.is_configured(fingerprint):
+                rich_print("{bold}xmake config is up to date", color="green")
+            else:
+                self.run(cmd)
+                self.save_fingerprint(fingerprint)
             cmd = [self.xmake, "-y", "-P", self.tempname, "--verbose"]
         self.run(cmd)
 
     def install(self):
+        if self._config_args is not None:
+            self.drive()
+            return
         cmd = [
             self.xmake,
             "install",
@@ -91,38 +237,74 @@ class XMaker:
             self.tempname,
             "--verbose",
             "-o",
-            self.tempname,
+            self.root,
         ]
         self.run(cmd)
 
-    def show(self):
-        cmd = [
-            self.xmake,
-            "show",
-            "-y",
-            "-P",
-            self.tempname,
-            "-ltargets",
-            "--json",
-        ]
-        output = self.run(cmd, False)
-        targets = []
+    def drive(self):
+        """Configure, build and install with one xmake process"""
+        script = Path(__file__).parent / "templates" / "driver.lua"
+        options = json.dumps(config_options(self._config_args))
+        configure = not self.is_configured(self._fingerprint)
+        manifest = Path(self.tempname) / INSTALLED_FILE
+        # Not the list of a previous build
+        manifest.unlink(missing_ok=True)
+        cmd = [self.xmake, "lua", "-y", "-P", self.tempname, str(script), options,
+               "true" if configure else "false", self.root, str(manifest)]
+        # The output of the build is streamed, the list is read afterwards
+        self.run(cmd)
+        self.installed = read_installed(manifest)
+        if configure:
+            self.save_fingerprint(self._fingerprint)
+
+    def config_fingerprint(self, arch_args):
+        """What xmake config depends on, to skip it when nothing changed"""
+        return {
+            "args": arch_args + split(self.command),
+            "xmake": executable_id(self.xmake),
+            # python.* rules find the Python running the build
+            "python": [sys.executable, sys.version],
+            "env": {name: os.environ[name] for name in CONFIG_ENV if name in os.environ},
+            # The xmake.lua written by init() includes the project
+            "scripts": hash_files(
+                [Path(self.tempname) / "xmake.lua"]
+                + xmake_scripts(Path(self.project) / "xmake.lua")
+            ),
+        }
+
+    def is_configured(self, fingerprint):
+        """Whether the build tree was configured with the same fingerprint"""
         try:
-            targets = json.loads(output)
-        except json.decoder.JSONDecodeError:
-            print(f"{output}")
-        kinds = []
-        for target in targets:
-            kind = 0
-            cmd = [self.xmake, "show", "-y", "-P", self.tempname, "-t", target]
-            text = self.run(cmd, False)
-            if text.find("phony") == -1 or text.find("packages") != -1:
-                kind = 1
-                if text.find("python.") != -1:
-                    kind = 2
-            kinds += [kind]
-        if 2 in kinds:
-            return 2
-        if 1 in kinds:
-            return 1
-        return 0
+            with open(Path(self.tempname) / FINGERPRINT_FILE, encoding="utf-8") as f:
+                return json.load(f) == fingerprint
+        except (OSError, ValueError):
+            return False
+
+    def save_fingerprint(self, fingerprint):
+        path = Path(self.tempname) / FINGERPRINT_FILE
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(fingerprint, f)
+
+    def show_key(self):
+        """What show() depends on, to cache its result"""
+        templates = Path(__file__).parent / "templates"
+        scripts = xmake_scripts(Path(self.project) / "xmake.lua")
+        return {
+            "scripts": hash_files(
+                scripts + [templates / "xmake.lua", templates / "introspect.lua"]
+            ),
+            "xmake": executable_id(self.xmake),
+            "command": self.command,
+        }
+
+    def show(self):
+        """The kind of the wheel, from the targets listed by one xmake process"""
+        script = Path(__file__).parent / "templates" / "introspect.lua"
+        cmd = [self.xmake, "lua", "-y", "-P", self.tempname, str(script)]
+        targets = parse_targets(self.run(cmd, capture=True))
+        if targets is None:
+            # Packaging the project as pure Python would leave its binaries out
+            raise ValueError("xmake didn't print the targets of the project")
+        self.targets = targets
+        return classify_targets(self.targets)
@@ -0,0 +1,60 @@
+r"""Helpers of the tests."""
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+
+from xmake_python.wheel import WheelBuilder
+
+PYPROJECT = """\
+[project]
+name = "example"
+version = "0.0.1"
+description = "example"
+"""
+
+
+def make_project(path: Path, wheel: str = "") -> Path:
+    r"""Make a project with some staged files."""
+    (path / "src" / "example").mkdir(parents=True)
+    (path / "src" / "example" / "__init__.py").write_text("")
+    (path / "pyproject.toml").write_text(PYPROJECT + wheel)
+    return path / "pyproject.toml"
+
+
+def build_wheel(ini_path: Path, target: Path, stage=None) -> WheelBuilder:
+    r"""Build a wheel, staging files into the build tree first."""
+    with open(target, "wb") as fp:
+        wb = WheelBuilder.from_ini_path(ini_path, fp)
+        if stage is not None:
+            stage(wb.root)
+        wb.build()
+    return wb
+
+
+def stage_files(root: Path) -> None:
+    r"""Stage files like ``xmake install`` would."""
+    platlib = root / "platlib" / "example"
+    platlib.mkdir(parents=True)
+    for i in range(20):
+        (platlib / f"mod{i}.py").write_text(f"x = {i}\n" * (i * 500))
+    (platlib / "empty.py").write_text("")
+    (platlib / "blob.bin").write_bytes(os.urandom(300000))
+    (root / "data" / "bin").mkdir(parents=True)
+    (root / "data" / "bin" / "tool").write_text("#!/bin/sh\n")
+    (root / "data" / "share").mkdir(parents=True)
+    (root / "data" / "share" / "x.txt").write_text("x" * 10000)
+
+
+@pytest.fixture
+def copy_stage(tmp_path: Path):
+    r"""Stage the same files, in ``tmp_path / "stage"``, into every build."""
+    stage = tmp_path / "stage"
+    stage.mkdir()
+    stage_files(stage)
+
+    def copy(root):
+        shutil.copytree(stage, root, dirs_exist_ok=True)
+
+    return copy
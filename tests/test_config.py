@@ -0,0 +1,17 @@
+r"""Test config."""
+import pytest
+
+from xmake_python.config import ConfigError, read_compression_level
+
+
+class Test:
+    r"""Test."""
+
+    @staticmethod
+    def test_read_compression_level() -> None:
+        assert read_compression_level("-1", "compression-level") == -1
+        assert read_compression_level("9", "compression-level") == 9
+        assert read_compression_level("max", "compression-level") == 9
+        for level in ("10", "-2", "fastest", True):
+            with pytest.raises(ConfigError):
+                read_compression_level(level, "compression-level")
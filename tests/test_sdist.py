@@ -0,0 +1,33 @@
+r"""Test sdist."""
+import tarfile
+from pathlib import Path
+
+from xmake_python.sdist import SdistBuilder
+
+from conftest import make_project
+
+
+class Test:
+    r"""Test."""
+
+    @staticmethod
+    def test_build_dir(tmp_path: Path, monkeypatch) -> None:
+        project = tmp_path / "project"
+        ini_path = make_project(project)
+        (project / "xmake.lua").write_text("target('m')\n")
+        (project / "build" / "tree" / "build").mkdir(parents=True)
+        (project / "build" / "tree" / "build" / "m.o").write_text("o")
+        (project / "build" / "tree" / "xmake-python-staging").mkdir()
+        outdir = tmp_path / "dist"
+        outdir.mkdir()
+        # From the project, like a PEP 517 frontend
+        monkeypatch.chdir(project)
+        sdist = SdistBuilder.from_ini_path(
+            Path("pyproject.toml"), {"build-dir": "build/tree"}
+        ).build(outdir)
+        with tarfile.open(sdist) as tf:
+            names = tf.getnames()
+        assert "example-0.0.1/xmake.lua" in names
+        assert "example-0.0.1/src/example/__init__.py" in names
+        # The build directory isn't shipped
+        assert not [name for name in names if "/build/" in name]
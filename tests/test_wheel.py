@@ -0,0 +1,640 @@
+r"""Test wheel."""
+import hashlib
+from base64 import urlsafe_b64encode
+import importlib.util
+import io
+import json
+import os
+import shutil
+import subprocess
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from xmake_python._elf import read_build_id, read_dynamic
+from xmake_python._pipeline import Prefetcher
+from xmake_python._verify import verify_wheels
+from xmake_python.builder.wheel_tag import WheelTag
+from xmake_python.wheel import WheelBuilder, main, make_wheel_in
+
+from conftest import build_wheel, make_project, stage_files
+
+
+class Test:
+    r"""Test."""
+
+    @staticmethod
+    def test_parallel_deflate(tmp_path: Path, monkeypatch, copy_stage) -> None:
+        serial = make_project(tmp_path / "serial")
+        parallel = make_project(
+            tmp_path / "parallel", "[tool.xmake.wheel]\njobs = 4\n"
+        )
+        monkeypatch.setenv("SOURCE_DATE_EPOCH", "1600000000")
+        build_wheel(serial, tmp_path / "a.whl", copy_stage)
+        build_wheel(parallel, tmp_path / "b.whl", copy_stage)
+
+        with zipfile.ZipFile(tmp_path / "b.whl") as zf:
+            assert zf.testzip() is None
+            assert "example/mod19.py" in zf.namelist()
+        a = (tmp_path / "a.whl").read_bytes()
+        assert a == (tmp_path / "b.whl").read_bytes()
+
+    @staticmethod
+    def test_pending_bytes(tmp_path: Path, monkeypatch, copy_stage) -> None:
+        serial = make_project(tmp_path / "serial")
+        parallel = make_project(
+            tmp_path / "parallel", "[tool.xmake.wheel]\njobs = 4\n"
+        )
+        monkeypatch.setenv("SOURCE_DATE_EPOCH", "1600000000")
+        build_wheel(serial, tmp_path / "a.whl", copy_stage)
+        monkeypatch.setattr("xmake_python.wheel.PENDING_BYTES", 100000)
+        windows = []
+        queue = WheelBuilder._queue
+
+        def record(self, member):
+            queue(self, member)
+            windows.append(self._pending_bytes)
+
+        monkeypatch.setattr(WheelBuilder, "_queue", record)
+        build_wheel(parallel, tmp_path / "b.whl", copy_stage)
+
+        # blob.bin alone is over the window, it is written before the next
+        assert max(windows) <= 100000
+        assert (tmp_path / "a.whl").read_bytes() == (tmp_path / "b.whl").read_bytes()
+
+    @staticmethod
+    def test_compression_policy(tmp_path: Path) -> None:
+        ini_path = make_project(tmp_path / "project", """\
+[tool.xmake.wheel.compression]
+level = "max"
+store = ["*.txt"]
+levels = { "mod1*.py" = "store" }
+auto = true
+""")
+        build_wheel(ini_path, tmp_path / "a.whl", stage_files)
+
+        with zipfile.ZipFile(tmp_path / "a.whl") as zf:
+            assert zf.testzip() is None
+            types = {i.filename: i.compress_type for i in zf.infolist()}
+        assert types["example-0.0.1.data/data/share/x.txt"] == zipfile.ZIP_STORED
+        assert types["example/mod12.py"] == zipfile.ZIP_STORED
+        assert types["example/blob.bin"] == zipfile.ZIP_STORED
+        assert types["example/mod9.py"] == zipfile.ZIP_DEFLATED
+
+    @staticmethod
+    def test_incremental(tmp_path: Path) -> None:
+        ini_path = make_project(tmp_path / "project", """\
+[tool.xmake.external-data]
+directory = "data"
+
+[tool.xmake.wheel]
+incremental = true
+jobs = 2
+""")
+        stage_files(tmp_path / "project" / "data")
+        outdir = tmp_path / "dist"
+        outdir.mkdir()
+        first = make_wheel_in(ini_path, outdir)
+        assert first.builder.index.hits == 0
+
+        tool = tmp_path / "project" / "data" / "data" / "bin" / "tool"
+        tool.write_text("#!/bin/bash\n")
+        second = make_wheel_in(ini_path, outdir)
+        # The staged data, and example/__init__.py from the source tree
+        assert second.builder.index.hits == 24
+        with zipfile.ZipFile(second.file) as zf:
+            assert zf.testzip() is None
+            assert zf.read("example-0.0.1.data/data/data/bin/tool") == b"#!/bin/bash\n"
+        data = second.file.read_bytes()
+
+        # Reusing members gives the same wheel as building from scratch
+        shutil.rmtree(tmp_path / "project" / "build")
+        third = make_wheel_in(ini_path, outdir)
+        assert third.builder.index.hits == 0
+        assert third.file.read_bytes() == data
+
+    @staticmethod
+    def test_zero_copy_stored(tmp_path: Path, monkeypatch) -> None:
+        blob = os.urandom(5 * 1024 * 1024 + 3)
+
+        def stage(root):
+            stage_files(root)
+            (root / "platlib" / "example" / "blob.bin").write_bytes(blob)
+
+        store = '[tool.xmake.wheel.compression]\nstore = ["*.bin"]\n'
+        serial = make_project(tmp_path / "serial", store)
+        parallel = make_project(
+            tmp_path / "parallel", store + "[tool.xmake.wheel]\njobs = 2\n"
+        )
+        monkeypatch.setenv("SOURCE_DATE_EPOCH", "1600000000")
+        build_wheel(serial, tmp_path / "a.whl", stage)
+        build_wheel(parallel, tmp_path / "b.whl", stage)
+
+        with zipfile.ZipFile(tmp_path / "a.whl") as zf:
+            assert zf.testzip() is None
+            info = zf.getinfo("example/blob.bin")
+            assert info.compress_type == zipfile.ZIP_STORED
+            assert zf.read(info) == blob
+        a = (tmp_path / "a.whl").read_bytes()
+        assert a == (tmp_path / "b.whl").read_bytes()
+
+    @staticmethod
+    def test_manifest(tmp_path: Path) -> None:
+        ini_path = make_project(tmp_path / "project")
+        wb = WheelBuilder.from_ini_path(ini_path, None)
+        with wb.temp:
+            stage_files(wb.root)
+            out = io.StringIO()
+            wb.plan().dump(out)
+            assert "100644\t10\tdeflate\texample-0.0.1.data/scripts/tool\t" in out.getvalue()
+
+            (wb.root / "metadata").mkdir()
+            (wb.root / "metadata" / "WHEEL").write_text("")
+            with pytest.raises(ValueError, match="WHEEL would be written twice"):
+                wb.plan()
+
+    @staticmethod
+    def test_pipeline(tmp_path: Path, monkeypatch, copy_stage) -> None:
+        class Installer:
+            r"""Stage files like ``xmake install``, slowly."""
+
+            def __init__(self, root):
+                self.root = root
+
+            def init(self):
+                pass
+
+            def show_key(self):
+                return {}
+
+            def show(self):
+                return 0
+
+            def package(self, tag):
+                pass
+
+            def install(self):
+                copy_stage(self.root)
+                time.sleep(1)
+
+        prefetchers = []
+
+        class Recorder(Prefetcher):
+            def __enter__(self):
+                prefetchers.append(self)
+                return super().__enter__()
+
+        monkeypatch.setattr("xmake_python.wheel.Prefetcher", Recorder)
+        monkeypatch.setenv("SOURCE_DATE_EPOCH", "1600000000")
+        serial = make_project(tmp_path / "serial")
+        build_wheel(serial, tmp_path / "a.whl", copy_stage)
+        ini_path = make_project(
+            tmp_path / "pipeline", "[tool.xmake.wheel]\npipeline = true\n"
+        )
+        with open(tmp_path / "b.whl", "wb") as fp:
+            wb = WheelBuilder.from_ini_path(ini_path, fp)
+            wb.xmake = Installer(wb.root)
+            wb.build()
+
+        # Everything staged was compressed while installing
+        assert prefetchers[0].hits == 24
+        a = (tmp_path / "a.whl").read_bytes()
+        assert a == (tmp_path / "b.whl").read_bytes()
+
+    @staticmethod
+    def test_pipeline_chmod(tmp_path: Path) -> None:
+        script = tmp_path / "script"
+        script.write_text("#!/bin/sh\n")
+        script.chmod(0o644)
+
+        def scan():
+            yield str(script), "script", os.stat(script)
+
+        with ThreadPoolExecutor(1) as executor:
+            prefetcher = Prefetcher(
+                executor, scan, lambda arcname, st: (arcname, 6),
+                lambda zinfo, path, level: (b"", ""),
+            )
+            # Settled on the second poll
+            prefetcher.poll()
+            prefetcher.poll()
+            script.chmod(0o755)
+            # The member is written with the new mode, not the prefetched one
+            assert prefetcher.take(str(script), "script", os.stat(script), 6) is None
+
+    @staticmethod
+    def test_streaming(tmp_path: Path, monkeypatch) -> None:
+        ini_path = make_project(
+            tmp_path / "project", "[tool.xmake.wheel]\njobs = 2\n"
+        )
+        # Pretend that the blob is huge, and needs ZIP64 extensions
+        monkeypatch.setattr("xmake_python.wheel.STREAM_THRESHOLD", 100000)
+        with monkeypatch.context() as m:
+            m.setattr(zipfile, "ZIP64_LIMIT", 200000)
+            wb = build_wheel(ini_path, tmp_path / "a.whl", stage_files)
+
+        assert len(wb.records) == 26
+        with zipfile.ZipFile(tmp_path / "a.whl") as zf:
+            assert zf.testzip() is None
+            # ZIP64 extra field
+            assert zf.getinfo("example/blob.bin").extra[:2] == b"\x01\x00"
+            record = zf.read("example-0.0.1.dist-info/RECORD").decode()
+        assert record.endswith("example-0.0.1.dist-info/RECORD,,\n")
+        assert len(record.splitlines()) == 27
+
+    @staticmethod
+    @pytest.mark.parametrize("backend, module", [
+        ("zlib", "zlib"), ("zlib-ng", "zlib_ng"), ("isal", "isal"),
+    ])
+    def test_deflate_backend(tmp_path: Path, backend: str, module: str) -> None:
+        # Else it would fall back to zlib
+        pytest.importorskip(module)
+        ini_path = make_project(
+            tmp_path / "project",
+            f'[tool.xmake.wheel]\ndeflate-backend = "{backend}"\n',
+        )
+        wb = build_wheel(ini_path, tmp_path / "a.whl", stage_files)
+        assert wb.compression.backend.name == backend
+
+        with zipfile.ZipFile(tmp_path / "a.whl") as zf:
+            assert zf.testzip() is None
+            data = zf.read("example/mod19.py")
+        assert data == b"x = 19\n" * 9500
+        if backend == "zlib":
+            # Same bytes as zipfile itself writes
+            with zipfile.ZipFile(tmp_path / "b.whl", "w") as zf:
+                zf.writestr("example/mod19.py", data, zipfile.ZIP_DEFLATED)
+            assert zf.getinfo("example/mod19.py").compress_size == \
+                wb.wheel_zip.getinfo("example/mod19.py").compress_size
+
+    @staticmethod
+    def test_compile_bytecode(tmp_path: Path, monkeypatch, copy_stage) -> None:
+        ini_path = make_project(tmp_path / "project", """\
+[tool.xmake.wheel]
+compile-bytecode = [0, 2]
+jobs = 2
+""")
+        monkeypatch.setattr("xmake_python._bytecode.MIN_POOL_TASKS", 2)
+        monkeypatch.setenv("SOURCE_DATE_EPOCH", "1600000000")
+
+        stage = tmp_path / "stage"
+        (stage / "platlib" / "example" / "bad.py").write_text("def (\n")
+        build_wheel(ini_path, tmp_path / "a.whl", copy_stage)
+        os.utime(stage / "platlib" / "example" / "mod3.py", (1e9, 1e9))
+        build_wheel(ini_path, tmp_path / "b.whl", copy_stage)
+
+        pyc = importlib.util.cache_from_source("example/mod3.py")
+        opt2 = importlib.util.cache_from_source("example/mod3.py", optimization=2)
+        with zipfile.ZipFile(tmp_path / "a.whl") as zf:
+            names = zf.namelist()
+            record = zf.read("example-0.0.1.dist-info/RECORD").decode()
+            data = zf.read(pyc)
+        assert opt2 in names
+        assert pyc + ",sha256=" in record
+        assert not any("bad." in name and name.endswith(".pyc") for name in names)
+        # Checked hash-based pyc
+        assert int.from_bytes(data[4:8], "little") == 3
+        # pycs don't depend on the mtime of the sources
+        assert (tmp_path / "a.whl").read_bytes() == (tmp_path / "b.whl").read_bytes()
+
+    @staticmethod
+    def test_metadata_sidecar(tmp_path: Path) -> None:
+        ini_path = make_project(
+            tmp_path / "project", "[tool.xmake.wheel]\nmetadata-sidecar = true\n"
+        )
+        outdir = tmp_path / "dist"
+        outdir.mkdir()
+        info = make_wheel_in(ini_path, outdir)
+
+        assert info.metadata_file == outdir / (info.file.name + ".metadata")
+        data = info.metadata_file.read_bytes()
+        with zipfile.ZipFile(info.file) as zf:
+            assert zf.read("example-0.0.1.dist-info/METADATA") == data
+        assert info.metadata_hash == hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def test_metadata_last(tmp_path: Path) -> None:
+        ini_path = make_project(tmp_path / "project", """\
+[tool.xmake.wheel]
+layout = "metadata-last"
+
+[project.entry-points.example_plugins]
+example = "example:main"
+""")
+        build_wheel(ini_path, tmp_path / "a.whl", stage_files)
+
+        with zipfile.ZipFile(tmp_path / "a.whl") as zf:
+            assert zf.testzip() is None
+            infos = zf.infolist()
+            record = zf.read("example-0.0.1.dist-info/RECORD").decode()
+            start_dir = zf.start_dir
+            metadata = zf.read("example-0.0.1.dist-info/METADATA")
+        names = [info.filename.partition("/")[2] for info in infos[-4:]]
+        assert names == ["RECORD", "METADATA", "WHEEL", "entry_points.txt"]
+        assert all(i.compress_type == zipfile.ZIP_STORED for i in infos[-3:])
+        # A contiguous block ending at the central directory
+        assert infos[-1].header_offset + len(infos[-1].FileHeader()) + \
+            infos[-1].file_size == start_dir
+        digest = urlsafe_b64encode(hashlib.sha256(metadata).digest()).rstrip(b"=")
+        assert f"METADATA,sha256={digest.decode()},{len(metadata)}" in record
+
+    @staticmethod
+    def test_wheelhouse_index(tmp_path: Path) -> None:
+        ini_path = make_project(tmp_path / "project", """\
+requires-python = ">=3.8"
+
+[tool.xmake.wheel]
+metadata-sidecar = true
+""")
+        outdir, index = tmp_path / "dist", tmp_path / "simple"
+        argv = [str(ini_path.parent), "-o", str(outdir), "--index", str(index)]
+        main(argv)
+        main(argv)
+
+        (wheel,) = outdir.glob("*.whl")
+        sha256 = hashlib.sha256(wheel.read_bytes()).hexdigest()
+        page = (index / "example" / "index.html").read_text()
+        assert page.count("<a ") == 1
+        assert f'href="../../dist/{wheel.name}#sha256={sha256}"' in page
+        assert 'data-requires-python="&gt;=3.8"' in page
+        assert "data-core-metadata=" in page
+        assert 'href="example/"' in (index / "index.html").read_text()
+        page = json.loads((index / "example" / "index.json").read_text())
+        assert page["meta"]["api-version"] == "1.1"
+        assert page["versions"] == ["0.0.1"]
+        assert page["files"][0]["size"] == wheel.stat().st_size
+
+    @staticmethod
+    def test_verify(tmp_path: Path) -> None:
+        ini_path = make_project(tmp_path / "project")
+        build_wheel(ini_path, tmp_path / "good.whl", stage_files)
+        with zipfile.ZipFile(tmp_path / "good.whl") as src, \
+                zipfile.ZipFile(tmp_path / "bad.whl", "w") as dst:
+            for info in src.infolist():
+                if info.filename == "example/mod1.py":
+                    continue
+                data = src.read(info)
+                if info.filename == "example/mod2.py":
+                    data += b"\n"
+                dst.writestr(info, data)
+            dst.writestr("example/extra.py", "")
+
+        # Corrupt the deflated data of a member
+        with zipfile.ZipFile(tmp_path / "bad.whl") as zf:
+            info = zf.getinfo("example/mod3.py")
+        with open(tmp_path / "bad.whl", "r+b") as f:
+            f.seek(info.header_offset + 26)
+            name_size = int.from_bytes(f.read(2), "little")
+            extra_size = int.from_bytes(f.read(2), "little")
+            f.seek(name_size + extra_size, os.SEEK_CUR)
+            f.write(b"\xff" * 8)
+
+        results = verify_wheels([str(tmp_path / "good.whl"), str(tmp_path / "bad.whl")], 2)
+        assert results[0].ok
+        assert [name for name, _ in results[1].mismatched] == [
+            "example/mod2.py", "example/mod3.py",
+        ]
+        assert "can't be read" in results[1].mismatched[1][1]
+        assert results[1].error is None
+        assert results[1].missing == ["example/mod1.py"]
+        assert results[1].extra == ["example/extra.py"]
+        with pytest.raises(SystemExit) as e:
+            main(["verify", "-q", str(tmp_path)])
+        assert e.value.code == 1
+
+    @staticmethod
+    def test_exclude(tmp_path: Path) -> None:
+        ini_path = make_project(tmp_path / "project", """\
+[tool.xmake.wheel]
+exclude = ["*.bin", "mod1*.py", "share/"]
+include = ["mod10.py"]
+""")
+        wb = build_wheel(ini_path, tmp_path / "a.whl", stage_files)
+
+        with zipfile.ZipFile(tmp_path / "a.whl") as zf:
+            names = set(zf.namelist())
+        assert "example/blob.bin" not in names
+        assert "example/mod11.py" not in names
+        assert "example/mod10.py" in names
+        assert "example/mod2.py" in names
+        assert "example-0.0.1.data/data/share/x.txt" not in names
+        assert "example-0.0.1.data/scripts/tool" in names
+        assert wb.path_filter.excluded == 12
+
+    @staticmethod
+    @pytest.mark.skipif(
+        not (shutil.which("cc") and shutil.which("objcopy") and shutil.which("strip")),
+        reason="needs a C compiler and binutils",
+    )
+    def test_split_debug_info(tmp_path: Path) -> None:
+        ini_path = make_project(tmp_path / "project", """\
+[tool.xmake.wheel.debug-info]
+action = "split"
+""")
+        (tmp_path / "lib.c").write_text("int f(int x) { return x + 1; }\n")
+        lib = tmp_path / "_lib.so"
+        subprocess.run(
+            ["cc", "-g", "-shared", "-fPIC", "-Wl,--build-id", "-o", lib,
+             tmp_path / "lib.c"],
+            check=True,
+        )
+        build_id = read_build_id(str(lib))
+        assert build_id
+
+        def stage(root):
+            stage_files(root)
+            shutil.copy(lib, root / "platlib" / "example" / "_lib.so")
+
+        outdir = tmp_path / "dist"
+        outdir.mkdir()
+        with open(outdir / "a.whl", "wb") as fp:
+            wb = WheelBuilder.from_ini_path(ini_path, fp)
+            wb.debug_output = outdir
+            stage(wb.root)
+            wb.build()
+
+        assert wb.debug_splitter.saved > 0
+        with zipfile.ZipFile(outdir / "a.whl") as zf:
+            stripped = zf.read("example/_lib.so")
+        assert len(stripped) == lib.stat().st_size - wb.debug_splitter.saved
+        assert b".gnu_debuglink" in stripped
+        with zipfile.ZipFile(outdir / wb.debug_archive_filename) as zf:
+            assert zf.namelist() == [f".build-id/{build_id[:2]}/{build_id[2:]}.debug"]
+
+    @staticmethod
+    @pytest.mark.skipif(
+        not (shutil.which("cc") and shutil.which("patchelf")),
+        reason="needs a C compiler and patchelf",
+    )
+    def test_vendor_libs(tmp_path: Path) -> None:
+        ini_path = make_project(tmp_path / "project", """\
+[tool.xmake.wheel.vendor-libs]
+enable = true
+""")
+        deps = tmp_path / "deps"
+        deps.mkdir()
+        (deps / "dep.c").write_text("int dep(int x) { return x * 2; }\n")
+        (tmp_path / "ext.c").write_text("int dep(int); int f(int x) { return dep(x); }\n")
+        subprocess.run(
+            ["cc", "-shared", "-fPIC", "-Wl,-soname,libdep.so", "-o", deps / "libdep.so",
+             deps / "dep.c"],
+            check=True,
+        )
+        ext = tmp_path / "_ext.so"
+        subprocess.run(
+            ["cc", "-shared", "-fPIC", "-o", ext, tmp_path / "ext.c",
+             "-L" + str(deps), "-ldep", "-Wl,-rpath," + str(deps)],
+            check=True,
+        )
+
+        def stage(root):
+            stage_files(root)
+            shutil.copy(ext, root / "platlib" / "example" / "_ext.so")
+
+        for _ in range(2):
+            wb = build_wheel(ini_path, tmp_path / "a.whl", stage)
+        # The second build reads libdep.so from the cache
+        assert wb.vendor.cache.hits == 1
+        assert set(wb.vendor.vendored) == {"libdep.so"}
+        with zipfile.ZipFile(tmp_path / "a.whl") as zf:
+            assert zf.read("example.libs/libdep.so") == (deps / "libdep.so").read_bytes()
+            (tmp_path / "out").mkdir()
+            out = zf.extract("example/_ext.so", tmp_path / "out")
+        assert read_dynamic(out).rpath == ["$ORIGIN/../example.libs"]
+        assert verify_wheels([str(tmp_path / "a.whl")])[0].ok
+
+    @staticmethod
+    def test_size_report(tmp_path: Path) -> None:
+        ini_path = make_project(tmp_path / "project", """\
+[tool.xmake.wheel.size-report]
+enable = true
+""")
+        wb = build_wheel(ini_path, tmp_path / "a.whl", stage_files)
+        report = wb.size_report
+        with zipfile.ZipFile(tmp_path / "a.whl") as zf:
+            infos = [i for i in zf.infolist() if not i.filename.endswith("/RECORD")]
+        assert report.total["files"] == len(infos)
+        assert report.total["size"] == sum(i.file_size for i in infos)
+        assert report.total["compressed"] == sum(i.compress_size for i in infos)
+        assert report.groups["extension"][".bin"]["size"] == 300000
+        assert report.groups["scheme"]["scripts"]["files"] == 1
+        assert report.groups["scheme"]["data"]["size"] == 10000
+        assert set(report.groups["top-level"]) == {
+            "example/", "example-0.0.1.data/", "example-0.0.1.dist-info/",
+        }
+        assert wb.size_diff == []
+
+        def stage_more(root):
+            stage_files(root)
+            (root / "platlib" / "example" / "more.bin").write_bytes(os.urandom(100000))
+
+        wb = build_wheel(ini_path, tmp_path / "a.whl", stage_more)
+        assert wb.size_report.groups["extension"][".bin"]["size"] == 400000
+        # The largest change comes first, after the total
+        assert wb.size_diff[1].split()[:2] == ["top-level", "example/"]
+
+        ini_path.write_text(ini_path.read_text() + "max-size = 200000\n")
+        saved = list((tmp_path / "project" / "build" / "xmake-python").glob("size-report-*"))
+        before = saved[0].read_text()
+        with pytest.raises(ValueError, match="max-size budget"):
+            build_wheel(ini_path, tmp_path / "b.whl", stage_more)
+        # The report of a failed build isn't compared with the next one
+        assert saved[0].read_text() == before
+
+    @staticmethod
+    def test_distributions(tmp_path: Path) -> None:
+        ini_path = make_project(tmp_path / "project", """\
+[tool.xmake.distributions.example-plugins]
+include = ["platlib/example_plugins/", "metadata/PLUGINS.txt"]
+description = "Plugins"
+dependencies = ["example==0.0.1"]
+
+[tool.xmake.distributions.example-headers]
+include = ["data/include/"]
+""")
+        with open(tmp_path / "a.whl", "wb") as fp, \
+                open(tmp_path / "b.whl", "wb") as fp_plugins, \
+                open(tmp_path / "c.whl", "wb") as fp_headers:
+            wb = WheelBuilder.from_ini_path(ini_path, fp)
+            (plugins, _), (headers, _) = wb.distributions
+            plugins.open_zip(fp_plugins)
+            headers.open_zip(fp_headers)
+            stage_files(wb.root)
+            (wb.root / "platlib" / "example_plugins").mkdir()
+            (wb.root / "platlib" / "example_plugins" / "p.py").write_text("p = 1\n")
+            (wb.root / "data" / "include").mkdir()
+            (wb.root / "data" / "include" / "h.h").write_text("int f(void);\n")
+            (wb.root / "metadata").mkdir()
+            (wb.root / "metadata" / "NOTICE").write_text("notice\n")
+            (wb.root / "metadata" / "PLUGINS.txt").write_text("plugins\n")
+            wb.build()
+
+        results = verify_wheels([str(tmp_path / n) for n in ("a.whl", "b.whl", "c.whl")])
+        assert all(result.ok for result in results)
+        with zipfile.ZipFile(tmp_path / "a.whl") as zf:
+            names = zf.namelist()
+        assert "example/mod1.py" in names
+        assert "example-0.0.1.data/scripts/tool" in names
+        assert not [n for n in names if "example_plugins" in n or n.endswith(".h")]
+        # Staged metadata goes to the distribution including it, else this one
+        assert "example-0.0.1.dist-info/NOTICE" in names
+        assert "example-0.0.1.dist-info/PLUGINS.txt" not in names
+
+        assert plugins.wheel_filename.startswith("example_plugins-0.0.1-")
+        with zipfile.ZipFile(tmp_path / "b.whl") as zf:
+            assert [n for n in zf.namelist() if ".dist-info/" not in n] == [
+                "example_plugins/p.py"
+            ]
+            metadata = zf.read("example_plugins-0.0.1.dist-info/METADATA").decode()
+            assert "example_plugins-0.0.1.dist-info/PLUGINS.txt" in zf.namelist()
+            assert "example_plugins-0.0.1.dist-info/NOTICE" not in zf.namelist()
+        assert "Name: example-plugins\n" in metadata
+        assert "Summary: Plugins\n" in metadata
+        assert "Requires-Dist: example==0.0.1\n" in metadata
+        with zipfile.ZipFile(tmp_path / "c.whl") as zf:
+            assert [n for n in zf.namelist() if ".dist-info/" not in n] == [
+                "example_headers-0.0.1.data/headers/h.h"
+            ]
+            assert not [n for n in zf.namelist() if n.endswith(("NOTICE", "PLUGINS.txt"))]
+
+        outdir = tmp_path / "dist"
+        outdir.mkdir()
+        info = make_wheel_in(ini_path, outdir)
+        assert [d.file.name.split("-")[0] for d in info.distributions] == [
+            "example_plugins", "example_headers",
+        ]
+        assert sorted(outdir.iterdir()) == sorted(
+            [info.file] + [d.file for d in info.distributions]
+        )
+
+    @staticmethod
+    def test_pure(tmp_path: Path, monkeypatch) -> None:
+        ini_path = make_project(tmp_path / "project", """\
+[tool.xmake.wheel]
+exclude = ["*.txt"]
+""")
+        package = tmp_path / "project" / "src" / "example"
+        (package / "sub").mkdir()
+        (package / "sub" / "mod.py").write_text("x = 1\n")
+        (package / "sub" / "notes.txt").write_text("x\n")
+        (package / "__pycache__").mkdir()
+        (package / "__pycache__" / "__init__.cpython-311.pyc").write_bytes(b"x")
+
+        def compute_best(*args, **kwargs):
+            raise AssertionError("pure wheels have a fixed tag")
+
+        monkeypatch.setattr(WheelTag, "compute_best", compute_best)
+        outdir = tmp_path / "dist"
+        outdir.mkdir()
+        info = make_wheel_in(ini_path, outdir)
+        assert info.builder.pure
+        assert info.file.name == "example-0.0.1-py3-none-any.whl"
+        with zipfile.ZipFile(info.file) as zf:
+            assert [n for n in zf.namelist() if ".dist-info/" not in n] == [
+                "example/__init__.py", "example/sub/mod.py",
+            ]
+            assert b"Root-Is-Purelib: true" in zf.read("example-0.0.1.dist-info/WHEEL")
+        assert verify_wheels([str(info.file)])[0].ok
@@ -0,0 +1,299 @@
+r"""Test xmake."""
+import json
+import os
+import subprocess
+import sys
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from xmake_python._kind_cache import xmake_scripts
+from xmake_python.builder.wheel_tag import WheelTag
+from xmake_python.config import ConfigError
+from xmake_python.wheel import WheelBuilder, make_wheel_in
+from xmake_python.xmake import XMaker, classify_targets, config_options, parse_targets
+
+from conftest import build_wheel, make_project
+
+
+class Test:
+    r"""Test."""
+
+    @staticmethod
+    def test_gc_sections(tmp_path: Path) -> None:
+        ini_path = make_project(tmp_path / "project", """\
+[tool.xmake.xmaker]
+command = "--ldflags=-Wl,-z,now"
+
+[tool.xmake.wheel.debug-info]
+gc-sections = true
+""")
+        (tmp_path / "project" / "xmake.lua").write_text("target('m')\n")
+        wb = WheelBuilder.from_ini_path(ini_path, None)
+        # The flags of the project are kept, templates/xmake.lua adds its own
+        assert wb.xmake.command == "--ldflags=-Wl,-z,now --gc_sections=y"
+        with wb.temp:
+            wb.xmake.init()
+            text = (wb.root / "xmake.lua").read_text()
+        assert 'add_ldflags("-Wl,--gc-sections", gnu)' in text
+        assert 'local gnu = {tools = {"gcc", "gxx", "clang", "clangxx"}}' in text
+
+    @staticmethod
+    def test_introspect_targets(tmp_path: Path) -> None:
+        targets = [
+            {"name": "docs", "kind": "phony", "rules": [], "packages": {}, "installfiles": {}},
+            {"name": "core", "kind": "static", "rules": ["c++"], "packages": ["fmt"],
+             "installfiles": []},
+            {"name": "_ext", "kind": "shared", "rules": ["python.library", "c++"],
+             "packages": [], "installfiles": [{"src": "a.py", "dst": "platlib/a.py"}]},
+        ]
+        xmake = tmp_path / "xmake"
+        xmake.write_text(
+            "#!/bin/sh\n"
+            'echo "$@" > "$(dirname "$0")/args"\n'
+            "echo 'loading project'\n"
+            f"echo 'xmake-python-targets: {json.dumps(targets)}'\n"
+        )
+        xmake.chmod(0o755)
+        xmaker = XMaker(str(xmake), tempname=str(tmp_path))
+        assert xmaker.show() == 2
+        args = (tmp_path / "args").read_text().split()
+        assert args[:4] == ["lua", "-y", "-P", str(tmp_path)]
+        assert args[4].endswith("introspect.lua")
+        assert [t["packages"] for t in xmaker.targets] == [[], ["fmt"], []]
+        assert classify_targets(xmaker.targets[:2]) == 1
+        assert classify_targets(xmaker.targets[:1]) == 0
+        assert parse_targets("no targets\n") is None
+        assert parse_targets("xmake-python-targets: {}\n") == []
+
+    @staticmethod
+    def test_kind_cache(tmp_path: Path) -> None:
+        xmake = tmp_path / "xmake"
+        xmake.write_text(
+            "#!/bin/sh\n"
+            'echo x >> "$(dirname "$0")/calls"\n'
+            "echo 'xmake-python-targets: "
+            '[{"name": "m", "kind": "shared", "rules": ["python.library"]}]\'\n'
+        )
+        xmake.chmod(0o755)
+        project = tmp_path / "project"
+        ini_path = make_project(project, f"""\
+[tool.xmake.xmaker]
+xmake = "{xmake}"
+project = "{project}"
+""")
+        (project / "xmake.lua").write_text('includes("sub", "plugins/*.lua")\n')
+        (project / "sub").mkdir()
+        (project / "sub" / "xmake.lua").write_text('includes("@builtin/check")\n')
+        (project / "plugins").mkdir()
+        (project / "plugins" / "a.lua").write_text("target('a')\n")
+        assert xmake_scripts(project / "xmake.lua") == [
+            project / "xmake.lua", project / "sub" / "xmake.lua",
+            project / "plugins" / "a.lua",
+        ]
+
+        def show():
+            wb = WheelBuilder.from_ini_path(ini_path, None)
+            with wb.temp:
+                return wb.show(), wb.targets
+
+        assert show() == (2, [{"name": "m", "kind": "shared", "rules": ["python.library"],
+                               "packages": [], "installfiles": []}])
+        assert show()[0] == 2
+        assert (tmp_path / "calls").read_text().count("x") == 1
+        # Editing an included script invalidates the cache
+        (project / "plugins" / "a.lua").write_text("target('b')\n")
+        assert show()[0] == 2
+        assert (tmp_path / "calls").read_text().count("x") == 2
+
+        # A failed introspection is an error, rather than a pure wheel
+        xmake.write_text('#!/bin/sh\necho x >> "$(dirname "$0")/calls"\nexit 1\n')
+        (project / "plugins" / "a.lua").write_text("target('c')\n")
+        for _ in range(2):
+            with pytest.raises(subprocess.CalledProcessError):
+                show()
+        assert (tmp_path / "calls").read_text().count("x") == 4
+        xmake.write_text("#!/bin/sh\necho 'no targets'\n")
+        with pytest.raises(ValueError, match="didn't print the targets"):
+            show()
+
+        # Nor is a cache which can't be written an error
+        cache = project / "build" / "xmake-python" / "kind.json"
+        cache.unlink()
+        cache.mkdir()
+        xmake.write_text("#!/bin/sh\necho 'xmake-python-targets: []'\n")
+        assert show() == (0, [])
+
+    @staticmethod
+    def test_driver(tmp_path: Path, capfd) -> None:
+        xmake = tmp_path / "xmake"
+        xmake.write_text(f"""\
+#!{sys.executable}
+import json, os, sys
+script, args = sys.argv[5], sys.argv[6:]
+if script.endswith("introspect.lua"):
+    print("xmake-python-targets: " + json.dumps(
+        [{{"name": "m", "kind": "binary", "rules": [], "packages": []}}]))
+    sys.exit()
+with open({str(tmp_path / "options")!r}, "w") as f:
+    f.write(args[0])
+root, manifest = args[2], args[3]
+print("warning: unused variable", file=sys.stderr)
+installed = [
+    "platlib/example/sub/m.py",
+    "platlib/example/a.py",
+    "platlib/example/__init__.py",
+    "data/bin/tool",
+    "data/share/x.txt",
+    "metadata/extra.txt",
+]
+for path in installed + ["platlib/example/stray.py"]:
+    os.makedirs(os.path.dirname(os.path.join(root, path)), exist_ok=True)
+    with open(os.path.join(root, path), "w") as f:
+        f.write(path)
+with open(manifest, "w") as f:
+    json.dump(installed, f)
+""")
+        xmake.chmod(0o755)
+        project = tmp_path / "project"
+        ini_path = make_project(project, f"""\
+[tool.xmake.xmaker]
+xmake = "{xmake}"
+project = "{project}"
+command = "-m debug --ccache=n"
+driver = true
+""")
+        (project / "xmake.lua").write_text("target('m')\n")
+        wb = build_wheel(ini_path, tmp_path / "a.whl")
+        # The output of the build isn't captured, even if it succeeds
+        assert "warning: unused variable" in capfd.readouterr().err
+        options = json.loads((tmp_path / "options").read_text())
+        assert options["yes"] is True
+        assert options["mode"] == "debug"
+        assert options["ccache"] == "n"
+        with zipfile.ZipFile(tmp_path / "a.whl") as zf:
+            names = zf.namelist()
+        # Files not listed by the driver aren't looked for
+        assert names[:5] == [
+            "example/__init__.py", "example/a.py", "example/sub/m.py",
+            "example-0.0.1.data/data/share/x.txt", "example-0.0.1.data/scripts/tool",
+        ]
+        assert "example-0.0.1.dist-info/extra.txt" in names
+        assert wb.installed[0] == "data/bin/tool"
+
+        assert config_options(["-a", "x86_64", "-mdebug", "-c", "--foo=a=b", "--ccache"]) == {
+            "arch": "x86_64", "mode": "debug", "clean": True, "foo": "a=b", "ccache": True,
+        }
+        with pytest.raises(ValueError):
+            config_options(["-x"])
+
+    @staticmethod
+    def test_config_fingerprint(tmp_path: Path, monkeypatch) -> None:
+        xmake = tmp_path / "xmake"
+        xmake.write_text('#!/bin/sh\necho "$1" >> "$(dirname "$0")/calls"\n')
+        xmake.chmod(0o755)
+        project = tmp_path / "project"
+        project.mkdir()
+        (project / "xmake.lua").write_text("target('m')\n")
+        build = tmp_path / "build"
+        build.mkdir()
+        xmaker = XMaker(str(xmake), "-m release", str(build), str(project), "0.0.1")
+        xmaker.init()
+        tag = WheelTag(pyvers=["py3"], abis=["none"], archs=["linux_x86_64"])
+        monkeypatch.delenv("CFLAGS", raising=False)
+
+        def configs():
+            return (tmp_path / "calls").read_text().split().count("config")
+
+        xmaker.package(tag)
+        xmaker.package(tag)
+        assert configs() == 1
+        monkeypatch.setenv("CFLAGS", "-O3")
+        xmaker.package(tag)
+        assert configs() == 2
+        (project / "xmake.lua").write_text("target('n')\n")
+        xmaker.package(tag)
+        xmaker.package(tag)
+        assert configs() == 3
+        xmaker.command = "-m debug"
+        xmaker.package(tag)
+        assert configs() == 4
+        # Another toolchain first in PATH, e.g. of an activated environment
+        monkeypatch.setenv("PATH", str(tmp_path / "toolchain") + os.pathsep + os.environ["PATH"])
+        xmaker.package(tag)
+        assert configs() == 5
+
+    @staticmethod
+    def test_build_dir(tmp_path: Path, monkeypatch) -> None:
+        xmake = tmp_path / "xmake"
+        xmake.write_text(f"""\
+#!{sys.executable}
+import os, sys
+args = sys.argv[1:]
+root = args[args.index("-P") + 1]
+with open(os.path.join({str(tmp_path)!r}, "calls"), "a") as f:
+    f.write(args[0] + "\\n")
+if args[0] == "lua":
+    print('xmake-python-targets: [{{"name": "m", "kind": "binary", "rules": []}}]')
+elif args[0] == "-y":
+    # Compile what isn't compiled yet
+    os.makedirs(os.path.join(root, "build"), exist_ok=True)
+    obj = os.path.join(root, "build", "m.o")
+    if not os.path.exists(obj):
+        with open(obj, "w") as f:
+            f.write("o")
+        with open(os.path.join({str(tmp_path)!r}, "calls"), "a") as f:
+            f.write("compile\\n")
+elif args[0] == "install":
+    package = os.path.join(args[args.index("-o") + 1], "platlib", "example")
+    os.makedirs(package, exist_ok=True)
+    with open(os.path.join(package, "__init__.py"), "w") as f:
+        f.write("")
+    # Only installed by the first build
+    if not os.path.exists(os.path.join(root, "installed")):
+        open(os.path.join(root, "installed"), "w").close()
+        open(os.path.join(package, "old.py"), "w").close()
+""")
+        xmake.chmod(0o755)
+        project = tmp_path / "project"
+        ini_path = make_project(project, f"""\
+[tool.xmake.xmaker]
+xmake = "{xmake}"
+project = "{project}"
+""")
+        (project / "xmake.lua").write_text("target('m')\n")
+        outdir = tmp_path / "dist"
+        outdir.mkdir()
+        settings = {"build-dir": "build/tree"}
+        first = make_wheel_in(ini_path, outdir, config_settings=settings)
+        second = make_wheel_in(ini_path, outdir, config_settings=settings)
+        staging = project / "build" / "tree" / "xmake-python-staging"
+        assert first.builder.root == second.builder.root == staging
+        calls = (tmp_path / "calls").read_text().split()
+        # Configured and compiled once, the object files are kept
+        assert calls.count("config") == 1
+        assert calls.count("compile") == 1
+        assert (project / "build" / "tree" / "build" / "m.o").exists()
+        with zipfile.ZipFile(second.file) as zf:
+            names = zf.namelist()
+        # The staging tree of the first build is gone
+        assert "example/__init__.py" in names
+        assert "example/old.py" not in names
+
+        # From the project, like a PEP 517 frontend, with relative paths
+        monkeypatch.chdir(project)
+        third = make_wheel_in(Path("pyproject.toml"), outdir, config_settings=settings)
+        assert third.builder.root == staging
+        with zipfile.ZipFile(third.file) as zf:
+            assert "example/__init__.py" in zf.namelist()
+        calls = (tmp_path / "calls").read_text().split()
+        assert calls.count("config") == 1
+        assert calls.count("compile") == 1
+
+        # The project would be overwritten
+        for build_dir in (".", ".."):
+            with pytest.raises(ConfigError, match="must not contain the project"):
+                WheelBuilder.from_ini_path(ini_path, None, config_settings={
+                    "build-dir": build_dir,
+                })